@@ -4,4 +4,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_system.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from face_attendance.asgi import STREAMING_PATHS, cancel_on_disconnect, video_socket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Django for HTTP, plus the camera WebSocket at /ws/video_feed/<camera_id>/"""
+    if scope['type'] == 'websocket':
+        await video_socket(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'].startswith(STREAMING_PATHS):
+        await cancel_on_disconnect(django_application, scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
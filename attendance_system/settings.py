@@ -54,6 +54,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'attendance_system.wsgi.application'
+ASGI_APPLICATION = 'attendance_system.asgi.application'
 
 # Database
 DATABASES = {
@@ -106,4 +107,57 @@ EMAIL_HOST = 'smtp.example.com'  # Replace with your SMTP server
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = ''  # Replace with your email
-EMAIL_HOST_PASSWORD = ''  # Replace with your password
\ No newline at end of file
+EMAIL_HOST_PASSWORD = ''  # Replace with your password
+
+# Face recognition
+# Gallery index backend: 'flat' (exact) or 'ivf' (approximate, for large galleries)
+FACE_INDEX_BACKEND = 'flat'
+# Backend options, e.g. {'n_probe': 8} for 'ivf' (higher n_probe = better recall, slower search)
+FACE_INDEX_OPTIONS = {}
+# Directory of the memory-mapped gallery snapshot written by `manage.py build_gallery_snapshot`
+FACE_GALLERY_SNAPSHOT = os.path.join(BASE_DIR, 'gallery_snapshot')
+# Embed the crops returned by face detection directly instead of detecting faces in them again
+FACE_EMBEDDING_SKIP_DETECTION = True
+# Models shared by student enrollment and live recognition
+FACE_RECOGNITION_MODEL = "VGG-Face"
+FACE_DETECTOR_BACKEND = "opencv"
+# Warm both models in a background thread when the app starts (also available as `manage.py warmup`)
+FACE_MODELS_PRELOAD = False
+# Live video pipeline: 'tracking' detects every N frames and tracks faces in between,
+# 'every_frame' runs detection and recognition on every frame
+FACE_PIPELINE_MODE = 'tracking'
+FACE_DETECT_EVERY_N_FRAMES = 5
+FACE_TRACK_IOU_THRESHOLD = 0.3
+# Detection cycles a track may go unmatched before it is dropped
+FACE_TRACK_MAX_MISSES = 2
+# A track's identity is confirmed, and its attendance recorded, after FACE_TRACK_MIN_VOTES matches among
+# its last FACE_TRACK_VOTE_WINDOW recognitions, or at once for a match of FACE_TRACK_CONFIRM_SIMILARITY
+FACE_TRACK_MIN_VOTES = 3
+FACE_TRACK_VOTE_WINDOW = 10
+FACE_TRACK_CONFIRM_SIMILARITY = 0.8
+# Frames kept by the camera capture thread; older frames are dropped so video never lags
+CAMERA_BUFFER_SIZE = 1
+# Seconds a camera keeps running after its last viewer disconnects
+STREAM_IDLE_TIMEOUT = 5.0
+# Extra cameras run during every attendance session, as {camera_id: source}. A source is a
+# local camera index, an RTSP/HTTP URL or a video file, e.g. {'room-101': 'rtsp://10.0.0.5/stream'}
+ATTENDANCE_CAMERAS = {}
+# Micro-batch aligned face crops from all frames and cameras into one model call
+FACE_BATCH_INFERENCE = True
+FACE_BATCH_MAX_SIZE = 32
+FACE_BATCH_MAX_WAIT_MS = 10
+# Worker processes for face detection and embedding (0 runs them in the web process)
+FACE_WORKER_PROCESSES = 0
+# Seconds to wait for the workers to finish one frame before giving up on it
+FACE_WORKER_TIMEOUT = 30.0
+# Recognized students are kept in memory and written in bulk every ATTENDANCE_FLUSH_INTERVAL seconds;
+# a later sighting is written again only if its probability improves by ATTENDANCE_MIN_IMPROVEMENT points
+ATTENDANCE_FLUSH_INTERVAL = 2.0
+ATTENDANCE_MIN_IMPROVEMENT = 5.0
+# Seconds the per-day attendance counts stay cached; writes of the day invalidate them at once
+ATTENDANCE_STATUS_CACHE_TTL = 5
+# Seconds a report (rows and counts per filter combination) stays cached; attendance writes invalidate
+# it at once. Invalidation reaches other processes only with a shared cache backend in CACHES
+REPORT_CACHE_TTL = 300
+# Rows per page on the reports page
+REPORT_PAGE_SIZE = 50
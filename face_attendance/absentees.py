@@ -0,0 +1,33 @@
+from datetime import datetime
+from django.db import transaction
+from .models import Student, Attendance
+from .events import attendance_events
+from .queries import invalidate_daily_counts, invalidate_reports
+from .rollups import refresh_days
+
+
+def mark_absent_students(date=None, batch_size=1000):
+    """Create an Absent row for every student without attendance on date (today by default)
+
+    The students are found with one NOT EXISTS query and written with
+    bulk_create in one transaction. The (student, date) unique constraint
+    and ignore_conflicts make repeated or concurrent calls safe. Returns the
+    number of students that had no row when the query ran.
+    """
+    date = date or datetime.now().date()
+    with transaction.atomic():
+        absent_ids = list(
+            Student.objects.exclude(attendance__date=date).values_list('id', flat=True)
+        )
+        Attendance.objects.bulk_create(
+            [Attendance(student_id=student_id, date=date, status='Absent') for student_id in absent_ids],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        if absent_ids:
+            # Dashboards reload their counts once the rows are visible
+            transaction.on_commit(lambda: refresh_days([date]))
+            transaction.on_commit(lambda: invalidate_daily_counts(date))
+            transaction.on_commit(invalidate_reports)
+            transaction.on_commit(attendance_events.invalidate)
+    return len(absent_ids)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Schedule, Attendance, Contact, SMTPSettings
+from .models import Student, Schedule, Attendance, DailyAttendanceSummary, Contact, SMTPSettings
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -19,6 +19,12 @@ class AttendanceAdmin(admin.ModelAdmin):
     search_fields = ('student__name', 'student__surname')
     date_hierarchy = 'date'
 
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('date', 'group', 'faculty', 'present', 'late', 'absent', 'mean_probability')
+    list_filter = ('faculty', 'group')
+    date_hierarchy = 'date'
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ('name', 'email')
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class FaceAttendanceConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'face_attendance'
+
+    def ready(self):
+        # Keep the in-memory face gallery in sync with Student changes, including admin edits
+        from . import signals
+
+        # Load the models in the background so the first enrollment or video frame does not stall
+        if getattr(settings, 'FACE_MODELS_PRELOAD', False):
+            from .model_registry import warmup_in_background
+            warmup_in_background()
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import re
+from . import streaming
+from .engine import engine
+from .events import attendance_events
+
+# Requests whose responses stream until the client goes away
+STREAMING_PATHS = ('/attendance/video_feed/', '/attendance/events/')
+VIDEO_SOCKET_PATH = re.compile(r'^/ws/video_feed/(?P<camera_id>[^/]+)/?$')
+
+
+async def cancel_on_disconnect(app, scope, receive, send):
+    """Run an ASGI app, cancelling it when the client disconnects
+
+    Django 4.2 never reads from the connection again once the request body
+    is in, so an endless streaming response would keep running for a viewer
+    that has left. The messages the app does read are passed through.
+    """
+    messages = asyncio.Queue()
+    app_task = asyncio.ensure_future(app(scope, messages.get, send))
+
+    async def watch():
+        while True:
+            message = await receive()
+            await messages.put(message)
+            if message['type'] == 'http.disconnect':
+                app_task.cancel()
+                return
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await app_task
+    except asyncio.CancelledError:
+        if not app_task.cancelled():
+            raise
+    finally:
+        watcher.cancel()
+
+
+async def video_socket(scope, receive, send):
+    """WebSocket endpoint for one camera
+
+    Annotated frames are sent as binary JPEG messages and attendance events
+    as JSON text messages.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    match = VIDEO_SOCKET_PATH.match(scope['path'])
+    source = engine.resolve(match['camera_id']) if match else None
+    if source is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async def send_frames():
+        # Subscribing here, not before the task starts, leaves nothing to release if it is cancelled first
+        async for jpeg in streaming.jpegs_async(source):
+            await send({'type': 'websocket.send', 'bytes': jpeg})
+
+    async def send_events():
+        last_id = attendance_events.sequence
+        while True:
+            events = await attendance_events.wait_async(last_id)
+            if events is None:
+                last_id = attendance_events.sequence  # Fell behind; skip to the newest event
+            for event in events or []:
+                last_id = event['id']
+                await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass  # Viewers have nothing to say
+
+    frames = asyncio.ensure_future(send_frames())
+    events = asyncio.ensure_future(send_events())
+    closed = asyncio.ensure_future(wait_for_disconnect())
+    done, pending = await asyncio.wait({frames, events, closed}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    # Let the cancelled tasks unwind, releasing the camera subscription, before the socket is done
+    await asyncio.gather(*pending, return_exceptions=True)
+    if frames in done:
+        # The camera stopped; tell the viewer
+        await send({'type': 'websocket.close', 'code': 1000})
@@ -0,0 +1,117 @@
+import collections
+import os
+import threading
+import time
+import cv2
+
+
+class CameraReader:
+    """Grab frames on a background thread, keeping only the most recent ones
+
+    The recognition loop calls read() and always gets the newest frame;
+    frames it was too slow to process are dropped instead of queueing up
+    inside OpenCV and delaying the video.
+    """
+
+    def __init__(self, source=0, buffer_size=1):
+        self.source = source
+        self.buffer = collections.deque(maxlen=max(1, buffer_size))
+        self.condition = threading.Condition()
+        self.capture = None
+        self.thread = None
+        self.running = False
+        self.sequence = 0  # Number of the newest captured frame
+        self.last_captured_at = None  # Capture time of the frame last returned by read()
+        self.last_read = 0  # Number of the newest frame handed to read()
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+        self.started_at = None
+        # Video files are replayed at their native rate so they behave like a live camera
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.source)
+        if not self.capture.isOpened():
+            self.capture.release()
+            return self
+        # Keep OpenCV from buffering frames of its own
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.running = True
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"camera-{self.source}", daemon=True)
+        self.thread.start()
+        return self
+
+    def is_opened(self):
+        return self.running
+
+    def _run(self):
+        frame_interval = 0.0
+        if self.is_file:
+            fps = self.capture.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 25
+
+        next_frame_at = time.monotonic()
+        while self.running:
+            success, frame = self.capture.read()
+            if not success:
+                break
+
+            with self.condition:
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.dropped += 1  # The oldest frame was never processed
+                self.buffer.append((time.monotonic(), frame))
+                self.sequence += 1
+                self.captured += 1
+                self.condition.notify_all()
+
+            if frame_interval:
+                next_frame_at += frame_interval
+                time.sleep(max(0.0, next_frame_at - time.monotonic()))
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def read(self, timeout=5.0):
+        """Return (success, frame) for the newest frame not yet returned"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.sequence == self.last_read and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, None
+                self.condition.wait(remaining)
+            if not self.buffer:
+                return False, None
+
+            self.last_captured_at, frame = self.buffer.pop()
+            # Anything older than the frame being returned is stale
+            self.dropped += len(self.buffer)
+            self.buffer.clear()
+            self.last_read = self.sequence
+            self.processed += 1
+            return True, frame
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+        if self.capture is not None:
+            self.capture.release()
+
+    def stats(self):
+        """Captured, dropped and processed frame counters"""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        with self.condition:
+            return {
+                'source': str(self.source),
+                'captured': self.captured,
+                'dropped': self.dropped,
+                'processed': self.processed,
+                'capture_fps': round(self.captured / elapsed, 2) if elapsed else 0.0,
+                'processed_fps': round(self.processed / elapsed, 2) if elapsed else 0.0,
+            }
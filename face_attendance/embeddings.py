@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def to_vector(embedding):
+    """Coerce a DeepFace.represent result or raw embedding into a float32 vector"""
+    if isinstance(embedding, np.ndarray) and embedding.dtype != object:
+        return embedding.astype(np.float32, copy=False).ravel()
+    if isinstance(embedding, np.ndarray):
+        embedding = embedding.tolist()
+
+    # DeepFace.represent returns [{'embedding': [...], 'facial_area': {...}}, ...]
+    if isinstance(embedding, dict):
+        embedding = embedding.get('embedding')
+    elif isinstance(embedding, (list, tuple)) and embedding and isinstance(embedding[0], (dict, list, tuple, np.ndarray)):
+        embedding = embedding[0]
+        if isinstance(embedding, dict):
+            embedding = embedding.get('embedding')
+
+    if embedding is None:
+        return None
+    return np.asarray(embedding, dtype=np.float32).ravel()
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row, returning the unit vectors and the original norms"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1)
+    safe_norms = np.where(norms > 0, norms, 1.0).astype(np.float32)
+    unit = np.ascontiguousarray(vectors / safe_norms[:, None], dtype=np.float32)
+    return unit, norms.astype(np.float32)
+
+
+def decode_vectors(buffers, dimension):
+    """Decode packed float32 vectors into one (n, dimension) matrix without per-element objects"""
+    if not buffers:
+        return np.empty((0, dimension), dtype=np.float32)
+    return np.frombuffer(b''.join(buffers), dtype='<f4').reshape(len(buffers), dimension).astype(np.float32, copy=False)
+
+
+def similarity_to_distance(similarities, query_norms, gallery_norms, metric):
+    """Convert cosine similarities of unit vectors into the configured distance metric"""
+    if metric == "cosine":
+        return 1.0 - similarities
+
+    # ||q - g||^2 = |q|^2 + |g|^2 - 2|q||g|cos(q, g), so euclidean distance on the
+    # raw vectors can be recovered from the normalized gallery and its norms
+    query_norms = np.asarray(query_norms, dtype=np.float32)
+    squared = (query_norms[:, None] ** 2 + gallery_norms ** 2
+               - 2.0 * query_norms[:, None] * gallery_norms * similarities)
+    return np.sqrt(np.maximum(squared, 0.0))
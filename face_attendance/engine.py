@@ -0,0 +1,88 @@
+from django.conf import settings
+from . import streaming
+from .recorder import get_attendance_recorder
+
+
+def configured_cameras():
+    """Extra cameras from ATTENDANCE_CAMERAS, e.g. {'room-101': 'rtsp://...', 'entrance': 1}"""
+    return {str(camera_id): source for camera_id, source in getattr(settings, 'ATTENDANCE_CAMERAS', {}).items()}
+
+
+def session_camera(setup_data):
+    """(camera_id, source) chosen on the attendance setup page"""
+    camera = str(setup_data.get('camera', 0))
+    if camera == 'ip':
+        return 'ip', setup_data.get('ip_camera')
+    return camera, int(camera) if camera.isdigit() else camera
+
+
+class AttendanceEngine:
+    """Runs every camera of an attendance session concurrently
+
+    Each camera has its own capture thread and producer (see streaming);
+    all of them share the process-wide face recognition service and models.
+    """
+
+    def __init__(self):
+        self.cameras = {}  # camera_id -> source
+
+    def resolve(self, camera_id, setup_data=None):
+        """Return the source for a camera id, or None if it is unknown"""
+        camera_id = str(camera_id)
+        if camera_id in self.cameras:
+            return self.cameras[camera_id]
+        if camera_id in configured_cameras():
+            return configured_cameras()[camera_id]
+        if setup_data:
+            session_id, source = session_camera(setup_data)
+            if session_id == camera_id:
+                return source
+        if camera_id.isdigit():
+            return int(camera_id)
+        return None
+
+    def start(self, setup_data, late_deadline=None):
+        """Start recognition on the session camera and every configured camera
+        
+        Students first recognized after late_deadline are recorded as Late.
+        """
+        cameras = configured_cameras()
+        session_id, source = session_camera(setup_data)
+        if source is not None and source != '':
+            cameras[session_id] = source
+
+        self.stop()
+        self.cameras = cameras
+        get_attendance_recorder().late_after = late_deadline
+        for source in cameras.values():
+            streaming.start_producer(source, keep_alive=True)
+        return list(cameras)
+
+    def stop(self):
+        """Stop every camera of the session"""
+        self.cameras = {}
+        streaming.stop_producers()
+        get_attendance_recorder().late_after = None
+
+    def stream(self, camera_id, setup_data=None, asynchronous=False):
+        """Multipart JPEG stream of one camera, or None if the camera id is unknown"""
+        source = self.resolve(camera_id, setup_data)
+        if source is None:
+            return None
+        return streaming.stream(source, asynchronous=asynchronous)
+
+    def stats(self):
+        """Per-camera throughput and latency"""
+        by_source = streaming.producers()
+        stats = {}
+        for camera_id, source in self.cameras.items():
+            producer = by_source.get(source)
+            stats[camera_id] = producer.stats() if producer is not None else {'source': str(source), 'running': False}
+        # Cameras opened directly by a viewer outside the session
+        for source, producer in by_source.items():
+            if source not in self.cameras.values():
+                stats[str(source)] = producer.stats()
+        return stats
+
+
+engine = AttendanceEngine()
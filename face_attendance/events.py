@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import json
+import threading
+import time
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import Attendance
+from .queries import cached_daily_counts
+
+
+class AttendanceEvents:
+    """In-process publish/subscribe of attendance events, with the live status kept in memory
+
+    The recorder publishes an event for every attendance row it creates.
+    Dashboards receive them over Server-Sent Events and read the current
+    status from the snapshot instead of querying the database. The snapshot
+    is reloaded after ATTENDANCE_STATUS_CACHE_TTL seconds, so rows written
+    by other processes show up too.
+    """
+
+    def __init__(self, history=256, recent=10):
+        self.condition = threading.Condition()
+        self.async_waiters = set()  # (event loop, asyncio.Event) of subscribers awaiting the next event
+        self.history = collections.deque(maxlen=history)  # Recent events, replayed to reconnecting clients
+        self.sequence = 0  # Id of the newest event
+        self.date = None  # Day the snapshot describes, None when it must be reloaded
+        self.loaded_at = 0.0
+        self.counts = {'Present': 0, 'Late': 0}
+        self.total = 0
+        self.recent = collections.deque(maxlen=recent)  # Newest first
+
+    def _load(self, today):
+        """Rebuild the snapshot of a day from the database"""
+        daily = cached_daily_counts(today)
+        counts = {'Present': daily['present'], 'Late': daily['late']}
+        total = daily['total']
+        attendance_records = Attendance.objects.filter(date=today).exclude(status='Absent').select_related('student')
+        recent = [
+            self._record(record.student, record.status, record.arrival_time, record.recognition_probability)
+            for record in attendance_records.order_by('-arrival_time')[:self.recent.maxlen]
+        ]
+        with self.condition:
+            changed = self.date == today and (counts, total) != (self.counts, self.total)
+            self.counts, self.total = counts, total
+            self.recent.clear()
+            self.recent.extend(recent)
+            self.date = today
+            self.loaded_at = time.monotonic()
+            current = self._counts()
+        if changed:
+            # Attendance written elsewhere, e.g. by another worker process
+            self.publish('counts', counts=current)
+
+    @staticmethod
+    def _record(student, status, arrival_time, probability):
+        return {
+            'name': f"{student.name} {student.surname}",
+            'time': arrival_time.strftime('%H:%M:%S') if arrival_time else '',
+            'status': status,
+            'probability': f"{probability:.2f}%",
+        }
+
+    def _counts(self):
+        present, late = self.counts['Present'], self.counts['Late']
+        return {
+            'present': present,
+            'late': late,
+            'absent': max(0, self.total - present - late),
+            'total': self.total,
+        }
+
+    def refresh(self):
+        """Reload the snapshot from the database if it is from another day or older than the TTL"""
+        today = datetime.now().date()
+        ttl = getattr(settings, 'ATTENDANCE_STATUS_CACHE_TTL', 5)
+        with self.condition:
+            stale = self.date != today or time.monotonic() - self.loaded_at >= ttl
+        if stale:
+            self._load(today)
+
+    def snapshot(self):
+        """Current counts and recent records of today"""
+        self.refresh()
+        with self.condition:
+            return dict(self._counts(), recent_records=list(self.recent), event_id=self.sequence)
+
+    def invalidate(self):
+        """Reload the snapshot from the database on next use, e.g. after bulk changes"""
+        with self.condition:
+            self.date = None
+        self.publish('refresh')
+
+    def publish(self, event_type, **data):
+        """Send an event to every subscriber"""
+        with self.condition:
+            self.sequence += 1
+            event = dict(data, id=self.sequence, type=event_type)
+            self.history.append(event)
+            self.condition.notify_all()
+            for loop, waiter in self.async_waiters:
+                loop.call_soon_threadsafe(waiter.set)
+        return event
+
+    def attendance_recorded(self, date, records):
+        """Publish newly created attendance rows as (student, status, arrival_time, probability)"""
+        with self.condition:
+            tracked = self.date == date
+        for student, status, arrival_time, probability in records:
+            record = self._record(student, status, arrival_time, probability)
+            with self.condition:
+                if tracked:
+                    self.counts[status] = self.counts.get(status, 0) + 1
+                    self.recent.appendleft(record)
+                counts = self._counts()
+            self.publish('late' if status == 'Late' else 'recognized', record=record, counts=counts)
+
+    def students_changed(self, delta):
+        """Adjust the total after students were added (delta > 0) or deleted"""
+        with self.condition:
+            if self.date is None:
+                return
+            self.total = max(0, self.total + delta)
+            counts = self._counts()
+        self.publish('counts', counts=counts)
+
+    def events_since(self, last_id):
+        """Events newer than last_id, or None if some of them are no longer in the history"""
+        with self.condition:
+            if last_id > self.sequence:
+                return None  # Id from before a restart
+            if last_id == self.sequence:
+                return []
+            if not self.history or self.history[0]['id'] > last_id + 1:
+                return None
+            return [event for event in self.history if event['id'] > last_id]
+
+    def wait(self, last_id, timeout=15.0):
+        """Block until an event newer than last_id is published; see events_since"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > last_id, timeout)
+        return self.events_since(last_id)
+
+    async def wait_async(self, last_id, timeout=15.0):
+        """Coroutine version of wait that does not block a thread"""
+        waiter = asyncio.Event()
+        entry = (asyncio.get_running_loop(), waiter)
+        with self.condition:
+            if self.sequence > last_id:
+                return self.events_since(last_id)
+            self.async_waiters.add(entry)
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.condition:
+                self.async_waiters.discard(entry)
+        return self.events_since(last_id)
+
+
+def sse_message(event_type, data, event_id=None):
+    """Encode one Server-Sent Events message"""
+    message = f"event: {event_type}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return (message + f"data: {json.dumps(data)}\n\n").encode()
+
+
+# Keeps proxies and browsers from closing an idle event stream
+SSE_KEEPALIVE = b': keepalive\n\n'
+
+
+def event_stream(last_id=None):
+    """Server-Sent Events for one dashboard: a snapshot, then every new event"""
+    if last_id is None or attendance_events.events_since(last_id) is None:
+        snapshot = attendance_events.snapshot()
+        last_id = snapshot['event_id']
+        yield sse_message('snapshot', snapshot, last_id)
+    while True:
+        events = attendance_events.wait(last_id)
+        if events is None:
+            # Too far behind to replay; start over from the current status
+            snapshot = attendance_events.snapshot()
+            last_id = snapshot['event_id']
+            yield sse_message('snapshot', snapshot, last_id)
+        elif not events:
+            attendance_events.refresh()  # Picks up rows of other processes, publishing their counts
+            yield SSE_KEEPALIVE
+        for event in events or []:
+            last_id = event['id']
+            yield sse_message(event['type'], event, last_id)
+
+
+async def event_stream_async(last_id=None):
+    """Async counterpart of event_stream for ASGI"""
+    snapshot = sync_to_async(attendance_events.snapshot)  # Loading the snapshot may query the database
+
+    if last_id is None or attendance_events.events_since(last_id) is None:
+        current = await snapshot()
+        last_id = current['event_id']
+        yield sse_message('snapshot', current, last_id)
+    while True:
+        events = await attendance_events.wait_async(last_id)
+        if events is None:
+            current = await snapshot()
+            last_id = current['event_id']
+            yield sse_message('snapshot', current, last_id)
+        elif not events:
+            await sync_to_async(attendance_events.refresh)()
+            yield SSE_KEEPALIVE
+        for event in events or []:
+            last_id = event['id']
+            yield sse_message(event['type'], event, last_id)
+
+
+attendance_events = AttendanceEvents()
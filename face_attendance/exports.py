@@ -0,0 +1,51 @@
+import csv
+import io
+
+REPORT_HEADERS = [
+    'Name', 'Surname', 'Father Name', 'Faculty', 'Direction', 'Group',
+    'Date', 'Status', 'Arrival Time', 'Recognition Probability',
+]
+REPORT_FIELDS = (
+    'student__name', 'student__surname', 'student__father_name', 'student__faculty', 'student__direction',
+    'student__group', 'date', 'status', 'arrival_time', 'recognition_probability',
+)
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def report_rows(attendance_records, chunk_size=2000):
+    """Yield the cells of each report row, fetching chunk_size rows at a time without model instances"""
+    rows = attendance_records.values_list(*REPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for *cells, probability in rows:
+        cells.append(f"{probability:.2f}%" if probability > 0 else None)
+        yield cells
+
+
+def csv_chunks(rows, rows_per_chunk=1000):
+    """Encode report rows as CSV, yielding the header at once and then one chunk per rows_per_chunk rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_HEADERS)
+    yield buffer.getvalue().encode()
+
+    buffer.seek(0)
+    buffer.truncate()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def write_xlsx(rows, file):
+    """Write report rows to an .xlsx path or binary file with openpyxl's constant-memory writer"""
+    from openpyxl import Workbook  # Also the engine pandas used for to_excel
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(REPORT_HEADERS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
@@ -0,0 +1,182 @@
+import numpy as np
+from collections import Counter
+from .embeddings import normalize_rows, similarity_to_distance
+
+
+class FlatIndex:
+    """Exact search over every gallery row"""
+
+    def __init__(self):
+        self.vectors = np.empty((0, 0), dtype=np.float32)  # L2-normalized embeddings, one row per photo
+        self.norms = np.empty(0, dtype=np.float32)  # Original norms, needed for euclidean distance
+        self.student_ids = np.empty(0, dtype=np.int64)  # Student id for each row
+        self.rows_per_student = Counter()
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1] if len(self) else 0
+
+    def max_rows_per_student(self):
+        """Largest number of rows owned by a single student"""
+        return max(self.rows_per_student.values()) if self.rows_per_student else 0
+
+    def add(self, vectors, student_ids):
+        """Append embeddings for the given student ids"""
+        if len(vectors) == 0:
+            return
+        units, norms = normalize_rows(np.vstack(vectors))
+        self.add_units(units, norms, student_ids)
+
+    def add_units(self, units, norms, student_ids):
+        """Append already L2-normalized embeddings together with their original norms"""
+        if len(units) == 0:
+            return
+        units = np.ascontiguousarray(units, dtype=np.float32)
+        norms = np.asarray(norms, dtype=np.float32)
+        student_ids = np.asarray(student_ids, dtype=np.int64)
+
+        if len(self):
+            self.vectors = np.ascontiguousarray(np.vstack([self.vectors, units]))
+            self.norms = np.concatenate([self.norms, norms])
+            self.student_ids = np.concatenate([self.student_ids, student_ids])
+        else:
+            self.vectors, self.norms, self.student_ids = units, norms, student_ids
+        self.rows_per_student.update(student_ids.tolist())
+        self._rows_added(len(units))
+
+    def remove(self, student_id):
+        """Drop every row of a student, returning the number of rows removed"""
+        keep = self.student_ids != student_id
+        removed = len(keep) - int(keep.sum())
+        if removed:
+            self.vectors = np.ascontiguousarray(self.vectors[keep])
+            self.norms = self.norms[keep]
+            self.student_ids = self.student_ids[keep]
+            self._rows_removed(keep)
+        self.rows_per_student.pop(student_id, None)
+        return removed
+
+    def search(self, query_units, query_norms, n, metric):
+        """Return (rows, distances) of the n nearest rows for each query, closest first"""
+        similarities = query_units @ self.vectors.T
+        distances = similarity_to_distance(similarities, query_norms, self.norms, metric)
+        return [self._nearest(np.arange(len(self)), row, n) for row in distances]
+
+    def _nearest(self, rows, distances, n):
+        if n < len(rows):
+            top = np.argpartition(distances, n - 1)[:n]
+            rows, distances = rows[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return rows[order], distances[order]
+
+    def _rows_added(self, count):
+        pass
+
+    def _rows_removed(self, keep):
+        pass
+
+
+class IVFIndex(FlatIndex):
+    """Approximate inverted-file index over spherical k-means clusters
+
+    Only the n_probe clusters whose centroids are closest to a query are
+    scanned, so n_probe trades recall for latency.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, min_train_size=2048, retrain_growth=2.0, train_iterations=10, seed=0):
+        super().__init__()
+        self.n_lists = n_lists  # Defaults to sqrt(gallery size) when trained
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size  # Below this size search stays exact
+        self.retrain_growth = retrain_growth  # Retrain once the gallery grows by this factor
+        self.train_iterations = train_iterations
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int64)  # Cluster of each row
+        self.trained_size = 0
+        self._list_rows = None  # Rows grouped by cluster, rebuilt lazily
+        self._list_offsets = None
+
+    def train(self):
+        """Cluster the current gallery and assign every row to a list"""
+        n_lists = self.n_lists or int(np.sqrt(len(self)))
+        n_lists = max(1, min(n_lists, len(self)))
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(len(self), n_lists * 256)
+        sample = self.vectors[rng.choice(len(self), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids, _ = normalize_rows(sums)
+
+        self.centroids = centroids
+        self.assignments = self._assign(self.vectors)
+        self.trained_size = len(self)
+        self._list_rows = None
+
+    def search(self, query_units, query_norms, n, metric):
+        """Return (rows, distances) of the n nearest rows found in the probed lists"""
+        if self.centroids is None:
+            return super().search(query_units, query_norms, n, metric)
+
+        rows_by_list, offsets = self._lists()
+        n_probe = min(self.n_probe, len(self.centroids))
+        centroid_similarities = query_units @ self.centroids.T
+        probes = np.argpartition(-centroid_similarities, n_probe - 1, axis=1)[:, :n_probe]
+
+        results = []
+        for query, query_norm, lists in zip(query_units, query_norms, probes):
+            rows = np.concatenate([rows_by_list[offsets[i]:offsets[i + 1]] for i in lists])
+            similarities = self.vectors[rows] @ query
+            distances = similarity_to_distance(similarities[None, :], [query_norm], self.norms[rows], metric)[0]
+            results.append(self._nearest(rows, distances, n))
+        return results
+
+    def _assign(self, units):
+        return np.argmax(units @ self.centroids.T, axis=1).astype(np.int64)
+
+    def _lists(self):
+        if self._list_rows is None:
+            self._list_rows = np.argsort(self.assignments, kind='stable')
+            counts = np.bincount(self.assignments, minlength=len(self.centroids))
+            self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return self._list_rows, self._list_offsets
+
+    def _rows_added(self, count):
+        if self.centroids is None:
+            if len(self) >= self.min_train_size:
+                self.train()
+        elif len(self) >= self.trained_size * self.retrain_growth:
+            self.train()
+        else:
+            new_assignments = self._assign(self.vectors[-count:])
+            self.assignments = np.concatenate([self.assignments, new_assignments])
+            self._list_rows = None
+
+    def _rows_removed(self, keep):
+        if self.centroids is not None:
+            self.assignments = self.assignments[keep]
+            self._list_rows = None
+
+
+INDEX_BACKENDS = {
+    'flat': FlatIndex,
+    'ivf': IVFIndex,
+}
+
+
+def build_index(backend='flat', **options):
+    """Create an empty gallery index for the named backend"""
+    try:
+        return INDEX_BACKENDS[backend](**options)
+    except KeyError:
+        raise ValueError(f"Unknown face index backend: {backend}")
@@ -0,0 +1,111 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+from . import model_registry
+
+
+class EmbeddingBatcher:
+    """Collects face crops from any frame or camera into micro-batches for the recognition model
+
+    A batch runs as soon as max_batch_size crops are waiting or the oldest
+    crop has waited max_wait seconds, and each caller gets its own result back.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait=0.01):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batch_sizes = collections.Counter()
+        self.faces = 0
+        self.latency_total = 0.0  # Submit to result, summed over faces
+        self.latency_max = 0.0
+        self.inference_total = 0.0  # Model time, summed over batches
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self.thread.start()
+        return self
+
+    def submit(self, crop):
+        """Queue an aligned BGR face crop; the Future resolves to its embedding vector"""
+        future = Future()
+        self.queue.put((time.monotonic(), crop, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = batch[0][0] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            embeddings = model_registry.represent_batch([crop for _, crop, _ in batch])
+        except Exception as e:
+            print(f"Error running embedding batch: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        inference_time = time.perf_counter() - start
+
+        done = time.monotonic()
+        for (submitted, _, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+
+        with self.lock:
+            self.batch_sizes[len(batch)] += 1
+            self.faces += len(batch)
+            self.inference_total += inference_time
+            for submitted, _, _ in batch:
+                self.latency_total += done - submitted
+                self.latency_max = max(self.latency_max, done - submitted)
+
+    def stats(self):
+        """Batch-size distribution and per-face latency"""
+        with self.lock:
+            batches = sum(self.batch_sizes.values())
+            return {
+                'batches': batches,
+                'faces': self.faces,
+                'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                'mean_batch_size': round(self.faces / batches, 2) if batches else 0.0,
+                'mean_face_latency_ms': round(self.latency_total / self.faces * 1000, 3) if self.faces else 0.0,
+                'max_face_latency_ms': round(self.latency_max * 1000, 3),
+                'inference_ms_per_face': round(self.inference_total / self.faces * 1000, 3) if self.faces else 0.0,
+            }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Return the process-wide embedding batcher, starting it on first use"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(
+                    max_batch_size=getattr(settings, 'FACE_BATCH_MAX_SIZE', 32),
+                    max_wait=getattr(settings, 'FACE_BATCH_MAX_WAIT_MS', 10) / 1000
+                ).start()
+    return _batcher
+
+
+def get_running_batcher():
+    """Return the batcher if it has been started, without starting it"""
+    return _batcher
@@ -0,0 +1,19 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from face_attendance.rollups import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily attendance summaries from the attendance rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=None, help="YYYY-MM-DD, the first day by default")
+        parser.add_argument('--end', type=date.fromisoformat, default=None, help="YYYY-MM-DD, the last day by default")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = rebuild_summaries(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} daily summaries in {time.perf_counter() - start:.2f} s"
+        ))
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from face_attendance.models import Student, Attendance
+from face_attendance.views import export_report
+
+
+def dataframe_export(request):
+    """The previous export_report: model instances, a list of dicts, then one DataFrame"""
+    import pandas as pd
+
+    data = []
+    for record in Attendance.objects.select_related('student').all():
+        data.append({
+            'Name': record.student.name,
+            'Surname': record.student.surname,
+            'Father Name': record.student.father_name,
+            'Faculty': record.student.faculty,
+            'Direction': record.student.direction,
+            'Group': record.student.group,
+            'Date': record.date,
+            'Status': record.status,
+            'Arrival Time': record.arrival_time,
+            'Recognition Probability': f"{record.recognition_probability:.2f}%" if record.recognition_probability > 0 else None
+        })
+    response = HttpResponse(content_type='application/vnd.ms-excel')
+    pd.DataFrame(data).to_excel(response, index=False)
+    return response
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports KiB
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare time to first byte, total time and peak RSS of the report export paths, "
+        "each in its own process, on synthetic rows in a scratch SQLite database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=200, help="Attendance rows per student (one per day)")
+        parser.add_argument('--modes', nargs='+', default=['csv', 'xlsx', 'dataframe'], choices=['csv', 'xlsx', 'dataframe'])
+        # Used by the child processes, which run against the scratch database
+        parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+        parser.add_argument('--measure', choices=['csv', 'xlsx', 'dataframe'], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['prepare']:
+            call_command('migrate', verbosity=0)
+            self.seed(options['students'], options['days'])
+            self.stdout.write(str(Attendance.objects.count()))
+            return
+        if options['measure']:
+            self.measure(options['measure'])
+            return
+
+        # The exports run in child processes, which cannot see rows of an uncommitted transaction;
+        # committing them to a throwaway database leaves the configured one untouched
+        with tempfile.TemporaryDirectory() as scratch:
+            env = self.scratch_env(scratch)
+            rows = self.run_child(env, '--prepare', '--students', str(options['students']), '--days', str(options['days']))
+            self.stdout.write(f"Exporting {rows} attendance rows")
+
+            for mode in options['modes']:
+                result = json.loads(self.run_child(env, '--measure', mode))
+                self.stdout.write(
+                    f"{mode:<10} first byte {result['ttfb'] * 1000:9.1f} ms  total {result['total']:7.2f} s  "
+                    f"peak RSS {result['peak'] / 2**20:8.1f} MiB (+{(result['peak'] - result['baseline']) / 2**20:.1f} MiB)  "
+                    f"size {result['size'] / 2**20:7.1f} MiB"
+                )
+
+    def scratch_env(self, scratch):
+        """Environment of child processes whose settings point at a SQLite database inside scratch"""
+        database = os.path.join(scratch, 'benchmark.sqlite3')
+        with open(os.path.join(scratch, 'benchmark_settings.py'), 'w') as file:
+            file.write(
+                f"from {settings.SETTINGS_MODULE} import *\n\n"
+                f"DATABASES = {{'default': {{'ENGINE': 'django.db.backends.sqlite3', 'NAME': {database!r}}}}}\n"
+            )
+        return dict(os.environ, DJANGO_SETTINGS_MODULE='benchmark_settings',
+                    PYTHONPATH=os.pathsep.join([scratch] + [path for path in sys.path if path]))
+
+    def run_child(self, env, *arguments):
+        """Run this command in a fresh process, returning the last line it printed"""
+        output = subprocess.run(
+            [sys.executable, '-m', 'django', 'benchmark_export', *arguments],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        return output.strip().splitlines()[-1]
+
+    def measure(self, mode):
+        """Run one export in this fresh process, so its peak RSS includes C-level buffers and nothing else"""
+        if mode == 'dataframe':
+            import pandas  # Counted in the baseline: views imported it at startup before the streaming export
+        baseline = peak_rss()
+        ttfb, total, size = self.run(mode)
+        self.stdout.write(json.dumps({'ttfb': ttfb, 'total': total, 'size': size, 'baseline': baseline, 'peak': peak_rss()}))
+
+    def seed(self, students, days):
+        Student.objects.bulk_create([
+            Student(name=f"Student{i}", surname="Bench", father_name="Bench", faculty=f"Faculty{i % 5}",
+                    direction="Benchmark", group=f"G{i % 40}")
+            for i in range(students)
+        ], batch_size=1000)
+        student_ids = list(Student.objects.values_list('id', flat=True))
+
+        start = date.today() - timedelta(days=days)
+        for day in range(days):
+            Attendance.objects.bulk_create([
+                Attendance(student_id=student_id, date=start + timedelta(days=day), status='Present',
+                           recognition_probability=75.0)
+                for student_id in student_ids
+            ], batch_size=1000)
+
+    def run(self, mode):
+        """Returns (seconds to first byte, total seconds, bytes) for one export"""
+        start = time.perf_counter()
+        if mode == 'dataframe':
+            response = dataframe_export(None)
+        else:
+            response = export_report(RequestFactory().get('/reports/export/', {'format': mode} if mode == 'csv' else {}))
+
+        ttfb = None
+        size = 0
+        for chunk in response:
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            size += len(chunk)
+        # response.close() would fire request_finished and close the database connection
+        if getattr(response, 'file_to_stream', None) is not None:
+            response.file_to_stream.close()
+        return ttfb or 0.0, time.perf_counter() - start, size
@@ -0,0 +1,70 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from face_attendance.embeddings import normalize_rows
+from face_attendance.indexes import build_index
+
+
+class Command(BaseCommand):
+    help = "Compare recall@1 and per-query latency of the gallery index backends on synthetic embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10000)
+        parser.add_argument('--photos', type=int, default=4, help="Photos per student")
+        parser.add_argument('--dim', type=int, default=2622, help="Embedding size (2622 for VGG-Face)")
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--loop-queries', type=int, default=20, help="Queries run through the per-row Python loop")
+        parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+        parser.add_argument('--noise', type=float, default=0.6, help="Photo noise relative to identity spread")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        students, photos, dim = options['students'], options['photos'], options['dim']
+        noise = options['noise']
+
+        # Each student is a random identity vector, each photo a noisy copy of it
+        identities = rng.standard_normal((students, dim), dtype=np.float32)
+        gallery = np.repeat(identities, photos, axis=0)
+        gallery += noise * rng.standard_normal(gallery.shape, dtype=np.float32)
+        student_ids = np.repeat(np.arange(1, students + 1), photos)
+
+        query_students = rng.integers(0, students, options['queries'])
+        queries = identities[query_students] + noise * rng.standard_normal((len(query_students), dim), dtype=np.float32)
+        query_units, query_norms = normalize_rows(queries)
+
+        self.stdout.write(f"Gallery: {students} students x {photos} photos = {len(gallery)} rows, dim {dim}")
+
+        # Reference: the per-row Python loop previously used by find_closest_match
+        loop_queries = queries[:options['loop_queries']]
+        start = time.perf_counter()
+        for query in loop_queries:
+            distances = [1 - np.dot(query, known) / (np.linalg.norm(query) * np.linalg.norm(known)) for known in gallery]
+            np.argmin(distances)
+        loop_ms = (time.perf_counter() - start) / max(len(loop_queries), 1) * 1000
+        self.stdout.write(f"{'python loop':<16} recall@1 1.000  {loop_ms:9.3f} ms/query")
+
+        flat = build_index('flat')
+        flat.add(gallery, student_ids)
+        exact, flat_ms = self.run(flat, query_units, query_norms)
+        self.stdout.write(f"{'flat':<16} recall@1 1.000  {flat_ms:9.3f} ms/query")
+
+        start = time.perf_counter()
+        ivf = build_index('ivf', min_train_size=1)
+        ivf.add(gallery, student_ids)
+        self.stdout.write(f"ivf: {len(ivf.centroids)} lists trained in {time.perf_counter() - start:.2f} s")
+
+        for n_probe in options['n_probe']:
+            ivf.n_probe = n_probe
+            found, ivf_ms = self.run(ivf, query_units, query_norms)
+            recall = np.mean(found == exact)
+            self.stdout.write(f"{f'ivf n_probe={n_probe}':<16} recall@1 {recall:.3f}  {ivf_ms:9.3f} ms/query")
+
+    def run(self, index, query_units, query_norms):
+        """Return the top-1 student per query and the mean latency of one-query searches"""
+        found = np.zeros(len(query_units), dtype=np.int64)
+        start = time.perf_counter()
+        for i in range(len(query_units)):
+            rows, _ = index.search(query_units[i:i + 1], query_norms[i:i + 1], 1, "cosine")[0]
+            found[i] = index.student_ids[rows[0]] if len(rows) else -1
+        return found, (time.perf_counter() - start) / len(query_units) * 1000
@@ -0,0 +1,120 @@
+import statistics
+import time
+from datetime import date, time as dtime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from face_attendance.models import Student, Attendance
+
+# Columns of the indexes added for the attendance access patterns
+BENCHMARK_INDEXES = {
+    Attendance._meta.db_table: [['date', 'status'], ['date', 'arrival_time'], ['date', 'id']],
+    Student._meta.db_table: [['faculty'], ['group']],
+}
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic attendance and compare query plans and timings with and without the attendance indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=200, help="Attendance rows per student (one per day)")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per query; the median is reported")
+
+    def handle(self, *args, **options):
+        # Everything, including dropped indexes, is rolled back at the end
+        with transaction.atomic():
+            start = time.perf_counter()
+            first_day, last_day, groups, faculties = self.seed(options['students'], options['days'])
+            self.stdout.write(
+                f"Seeded {Attendance.objects.count()} attendance rows in {time.perf_counter() - start:.1f} s"
+            )
+            queries = self.queries(first_day, last_day, groups[0], faculties[0])
+
+            self.stdout.write(self.style.MIGRATE_HEADING("With indexes"))
+            after = self.run(queries, options['repeat'], 'indexed')
+            dropped = self.drop_indexes()
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Without indexes ({', '.join(dropped)})"))
+            before = self.run(queries, options['repeat'], 'unindexed')
+
+            self.stdout.write(self.style.MIGRATE_HEADING("Summary"))
+            for name in queries:
+                self.stdout.write(
+                    f"{name:<28} {before[name]:9.2f} ms -> {after[name]:9.2f} ms  ({before[name] / max(after[name], 1e-6):.1f}x)"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, students, days):
+        groups = [f"BG{i}" for i in range(40)]
+        faculties = [f"BF{i}" for i in range(8)]
+        Student.objects.bulk_create([
+            Student(name=f"Student{i}", surname="Bench", father_name="Bench", faculty=faculties[i % len(faculties)],
+                    direction="Benchmark", group=groups[i % len(groups)])
+            for i in range(students)
+        ], batch_size=1000)
+        student_ids = list(Student.objects.filter(surname="Bench").values_list('id', flat=True))
+
+        first_day = date.today() - timedelta(days=days + 365)  # Clear of real attendance
+        for day in range(days):
+            rows = []
+            for n, student_id in enumerate(student_ids):
+                kind = (n + day) % 10
+                status = 'Absent' if kind < 2 else 'Late' if kind == 2 else 'Present'
+                rows.append(Attendance(
+                    student_id=student_id,
+                    date=first_day + timedelta(days=day),
+                    status=status,
+                    arrival_time=None if status == 'Absent' else dtime(8, n % 60, day % 60),
+                    recognition_probability=0.0 if status == 'Absent' else 60.0 + n % 40
+                ))
+            Attendance.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        return first_day, first_day + timedelta(days=days - 1), groups, faculties
+
+    def queries(self, first_day, last_day, group, faculty):
+        """The queries behind the status endpoint, the summary and the reports page"""
+        day = last_day
+        month = (last_day - timedelta(days=30), last_day)
+        return {
+            'status counts of a day': Attendance.objects.filter(date=day).values('status').annotate(n=Count('id')).order_by(),
+            'recent arrivals of a day': Attendance.objects.filter(date=day).exclude(status='Absent').order_by('-arrival_time')[:10],
+            'report page, month + group': Attendance.objects.filter(date__range=month, student__group=group)
+                .order_by('-date', '-id').values('id', 'date', 'status', 'student__name')[:50],
+            'report counts, month + faculty': Attendance.objects.filter(date__range=month, student__faculty=faculty)
+                .values('status').annotate(n=Count('id')).order_by(),
+            'deep keyset page': Attendance.objects.filter(Q(date__lt=first_day + timedelta(days=10)))
+                .order_by('-date', '-id').values('id', 'date', 'status')[:50],
+        }
+
+    def explain(self, queryset, label):
+        """Query plan of a queryset; the label comment keeps the driver from reusing a plan prepared before DROP INDEX"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql} /* {label} */", params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def run(self, queries, repeat, label):
+        timings = {}
+        for name, queryset in queries.items():
+            plan = self.explain(queryset, label)
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())  # all() makes a fresh, uncached copy
+                runs.append((time.perf_counter() - start) * 1000)
+            timings[name] = statistics.median(runs)
+            self.stdout.write(f"{name:<28} {timings[name]:9.2f} ms")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+        return timings
+
+    def drop_indexes(self):
+        """Drop the benchmarked indexes inside the current transaction, returning their names"""
+        dropped = []
+        with connection.cursor() as cursor:
+            for table, wanted in BENCHMARK_INDEXES.items():
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for name, info in constraints.items():
+                    if info['index'] and not info['unique'] and not info['primary_key'] and info['columns'] in wanted:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+                        dropped.append(name)
+        return dropped
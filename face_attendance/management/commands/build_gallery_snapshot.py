@@ -0,0 +1,20 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from face_attendance.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write the face gallery to a memory-mappable snapshot shared by all workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.FACE_GALLERY_SNAPSHOT)
+        parser.add_argument('--model-name', default=getattr(settings, 'FACE_RECOGNITION_MODEL', 'VGG-Face'))
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        meta = write_snapshot(options['path'], options['model_name'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {meta['rows']} embeddings ({meta['dimension']}-d, version {meta['version']}) "
+            f"to {options['path']} in {time.perf_counter() - start:.2f} s"
+        ))
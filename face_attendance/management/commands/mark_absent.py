@@ -0,0 +1,18 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from face_attendance.absentees import mark_absent_students
+
+
+class Command(BaseCommand):
+    help = "Mark every student without attendance on a day as Absent"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None, help="YYYY-MM-DD, today by default")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        marked = mark_absent_students(options['date'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {marked} students absent in {time.perf_counter() - start:.2f} s"
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from face_attendance import model_registry
+
+
+class Command(BaseCommand):
+    help = "Load the face detector and recognition model and report how long each took"
+
+    def handle(self, *args, **options):
+        times = model_registry.warmup()
+        self.stdout.write(f"Recognition model: {model_registry.MODEL_NAME}, detector: {model_registry.DETECTOR_BACKEND}")
+        for name, seconds in times.items():
+            self.stdout.write(f"{name:<20} {seconds:8.3f} s")
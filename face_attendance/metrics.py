@@ -0,0 +1,54 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """Thread-safe call counts and wall time per pipeline stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.frames = 0
+            self.stages = {}  # stage -> [calls, total seconds, max seconds]
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds, calls=1):
+        with self.lock:
+            entry = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def count_frame(self):
+        with self.lock:
+            self.frames += 1
+
+    def summary(self):
+        """Return per-stage totals and averages in milliseconds"""
+        with self.lock:
+            frames = self.frames
+            stages = {name: list(entry) for name, entry in self.stages.items()}
+        return {
+            'frames': frames,
+            'stages': {
+                name: {
+                    'calls': calls,
+                    'total_ms': round(total * 1000, 3),
+                    'mean_ms': round(total / calls * 1000, 3) if calls else 0.0,
+                    'max_ms': round(longest * 1000, 3),
+                    'per_frame_ms': round(total / frames * 1000, 3) if frames else 0.0,
+                }
+                for name, (calls, total, longest) in stages.items()
+            },
+        }
@@ -0,0 +1,81 @@
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+import numpy as np
+
+from face_attendance.embeddings import to_vector, normalize_rows
+
+
+def convert_json_embeddings(apps, schema_editor):
+    """Move Student.face_embeddings JSON into one StudentEmbedding row per photo"""
+    Student = apps.get_model('face_attendance', 'Student')
+    StudentEmbedding = apps.get_model('face_attendance', 'StudentEmbedding')
+
+    for student in Student.objects.only('id', 'face_embeddings').iterator(chunk_size=100):
+        try:
+            embeddings = json.loads(student.face_embeddings or '[]')
+        except ValueError as e:
+            print(f"Skipping embeddings of student {student.id}: {e}")
+            continue
+
+        rows = []
+        for embedding in embeddings:
+            # Each entry is usually the list of dicts returned by DeepFace.represent
+            vector = to_vector(embedding)
+            if vector is None or not vector.size:
+                continue
+            units, norms = normalize_rows(vector)
+            rows.append(StudentEmbedding(
+                student_id=student.id,
+                model_name='VGG-Face',
+                dimension=units.shape[1],
+                norm=float(norms[0]),
+                vector=units[0].astype('<f4').tobytes()
+            ))
+        StudentEmbedding.objects.bulk_create(rows)
+
+
+def restore_json_embeddings(apps, schema_editor):
+    """Rebuild Student.face_embeddings JSON from the binary rows"""
+    Student = apps.get_model('face_attendance', 'Student')
+    StudentEmbedding = apps.get_model('face_attendance', 'StudentEmbedding')
+
+    for student in Student.objects.all().iterator(chunk_size=100):
+        embeddings = []
+        for row in StudentEmbedding.objects.filter(student_id=student.id):
+            vector = np.frombuffer(bytes(row.vector), dtype='<f4') * row.norm
+            embeddings.append(vector.tolist())
+        student.face_embeddings = json.dumps(embeddings)
+        student.save(update_fields=['face_embeddings'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_attendance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=50)),
+                ('dimension', models.PositiveIntegerField()),
+                ('norm', models.FloatField()),
+                ('vector', models.BinaryField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to='face_attendance.student')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='face_embeddings',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(convert_json_embeddings, restore_json_embeddings),
+        migrations.RemoveField(
+            model_name='student',
+            name='face_embeddings',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_attendance', '0002_studentembedding'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='faculty',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='group',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'status'], name='attendance_date_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'arrival_time'], name='attendance_date_arrival_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'id'], name='attendance_date_id_idx'),
+        ),
+    ]
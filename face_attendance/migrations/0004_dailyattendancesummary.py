@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:52
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, F, Q
+
+
+def backfill_summaries(apps, schema_editor):
+    """Summarize existing attendance; mirrors rollups.summary_rows on the historical models"""
+    Attendance = apps.get_model('face_attendance', 'Attendance')
+    DailyAttendanceSummary = apps.get_model('face_attendance', 'DailyAttendanceSummary')
+    rows = Attendance.objects.values(
+        'date', group=F('student__group'), faculty=F('student__faculty')
+    ).annotate(
+        present=Count('id', filter=Q(status='Present')),
+        late=Count('id', filter=Q(status='Late')),
+        absent=Count('id', filter=Q(status='Absent')),
+        mean_probability=Avg('recognition_probability', filter=~Q(status='Absent')),
+    ).order_by()
+    DailyAttendanceSummary.objects.bulk_create(
+        (DailyAttendanceSummary(**dict(row, mean_probability=row['mean_probability'] or 0.0)) for row in rows),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('face_attendance', '0003_attendance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('group', models.CharField(max_length=50)),
+                ('faculty', models.CharField(max_length=100)),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('late', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('mean_probability', models.FloatField(default=0.0)),
+            ],
+            options={
+                'unique_together': {('date', 'group', 'faculty')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
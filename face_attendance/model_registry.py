@@ -0,0 +1,102 @@
+import threading
+import time
+import cv2
+import numpy as np
+from deepface import DeepFace
+from django.conf import settings
+
+# Model names shared by enrollment (views.add_student) and recognition (services)
+MODEL_NAME = getattr(settings, 'FACE_RECOGNITION_MODEL', "VGG-Face")
+DETECTOR_BACKEND = getattr(settings, 'FACE_DETECTOR_BACKEND', "opencv")
+
+_lock = threading.Lock()
+_recognition_model = None
+_detector_ready = False
+load_times = {}  # Component -> seconds spent loading it in this process
+
+
+def get_recognition_model():
+    """Build the recognition network once per process"""
+    global _recognition_model
+    if _recognition_model is None:
+        with _lock:
+            if _recognition_model is None:
+                start = time.perf_counter()
+                # DeepFace caches built models, so represent() reuses this instance
+                _recognition_model = DeepFace.build_model(MODEL_NAME)
+                load_times['recognition_model'] = time.perf_counter() - start
+    return _recognition_model
+
+
+def ensure_detector():
+    """Build the face detector once per process"""
+    global _detector_ready
+    if not _detector_ready:
+        with _lock:
+            if not _detector_ready:
+                start = time.perf_counter()
+                # DeepFace caches the detector on first use
+                DeepFace.extract_faces(
+                    img_path=np.zeros((64, 64, 3), dtype=np.uint8),
+                    detector_backend=DETECTOR_BACKEND,
+                    enforce_detection=False
+                )
+                _detector_ready = True
+                load_times['detector'] = time.perf_counter() - start
+
+
+def extract_faces(img, detector_backend=None):
+    """DeepFace.extract_faces with the shared detector"""
+    ensure_detector()
+    return DeepFace.extract_faces(
+        img_path=img,
+        detector_backend=detector_backend or DETECTOR_BACKEND,
+        enforce_detection=False
+    )
+
+
+def represent(img, detector_backend=None):
+    """DeepFace.represent with the shared recognition model"""
+    get_recognition_model()
+    return DeepFace.represent(
+        img_path=img,
+        model_name=MODEL_NAME,
+        detector_backend=detector_backend or DETECTOR_BACKEND,
+        enforce_detection=False
+    )
+
+
+def represent_batch(crops):
+    """Embed aligned BGR face crops with one forward pass of the recognition model"""
+    model = get_recognition_model()
+    height, width = model.input_shape[1:3]
+    batch = np.stack([
+        crop if crop.shape[:2] == (height, width) else cv2.resize(crop, (width, height))
+        for crop in crops
+    ]).astype(np.float32)
+    # Same input as DeepFace.represent(detector_backend="skip"), which predicts one image at a time
+    return model.predict(batch, verbose=0)
+
+
+def warmup():
+    """Load both models and run one inference so the first real frame does not stall"""
+    ensure_detector()
+    get_recognition_model()
+    start = time.perf_counter()
+    represent(np.zeros((224, 224, 3), dtype=np.float32), detector_backend="skip")
+    load_times['first_inference'] = time.perf_counter() - start
+    return dict(load_times)
+
+
+def warmup_in_background():
+    """Warm the models on a daemon thread, logging the load times"""
+    def run():
+        try:
+            times = warmup()
+            print("Face models warmed up: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in times.items()))
+        except Exception as e:
+            print(f"Error warming up face models: {e}")
+    
+    thread = threading.Thread(target=run, name='face-model-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -1,26 +1,82 @@
-from django.db import models
-import json
+from django.db import models, transaction
 import numpy as np
+from .embeddings import to_vector, normalize_rows, decode_vectors
 
 class Student(models.Model):
     name = models.CharField(max_length=100)
     surname = models.CharField(max_length=100)
     father_name = models.CharField(max_length=100)
-    faculty = models.CharField(max_length=100)
+    faculty = models.CharField(max_length=100, db_index=True)  # Report filters
     direction = models.CharField(max_length=100)
-    group = models.CharField(max_length=50)
-    face_embeddings = models.TextField()  # Store face embeddings as JSON string
+    group = models.CharField(max_length=50, db_index=True)
     
-    def set_face_embeddings(self, embeddings_list):
-        self.face_embeddings = json.dumps([e.tolist() if isinstance(e, np.ndarray) else e for e in embeddings_list])
+    def set_face_embeddings(self, embeddings_list, model_name="VGG-Face"):
+        """Replace the stored embeddings for a model; the student must already be saved"""
+        rows = [StudentEmbedding.from_vector(self, e, model_name) for e in embeddings_list]
+        rows = [row for row in rows if row is not None]
+        with transaction.atomic():
+            self.embeddings.filter(model_name=model_name).delete()
+            StudentEmbedding.objects.bulk_create(rows)
     
-    def get_face_embeddings(self):
-        embeddings = json.loads(self.face_embeddings)
-        return [np.array(e) for e in embeddings]
+    def get_face_embeddings(self, model_name="VGG-Face"):
+        """Return the stored embeddings as an (n, dimension) float32 matrix"""
+        rows = list(self.embeddings.filter(model_name=model_name).values_list('vector', 'dimension', 'norm'))
+        dimension = rows[0][1] if rows else 0
+        units = decode_vectors([bytes(row[0]) for row in rows], dimension)
+        return units * np.array([row[2] for row in rows], dtype=np.float32)[:, None]
     
     def __str__(self):
         return f"{self.name} {self.surname}"
 
+class StudentEmbedding(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='embeddings')
+    model_name = models.CharField(max_length=50)
+    dimension = models.PositiveIntegerField()
+    norm = models.FloatField()  # Norm before normalization, needed for euclidean distance
+    vector = models.BinaryField()  # L2-normalized little-endian float32
+    
+    @classmethod
+    def from_vector(cls, student, embedding, model_name):
+        """Build an unsaved row from a raw embedding or DeepFace.represent result"""
+        vector = to_vector(embedding)
+        if vector is None or not vector.size:
+            return None
+        units, norms = normalize_rows(vector)
+        return cls(
+            student=student,
+            model_name=model_name,
+            dimension=units.shape[1],
+            norm=float(norms[0]),
+            vector=units[0].astype('<f4').tobytes()
+        )
+    
+    @classmethod
+    def load_gallery(cls, model_name):
+        """Return (vectors, norms, student_ids) arrays for every stored embedding of a model"""
+        rows = cls.objects.filter(model_name=model_name).order_by('id').values_list('student_id', 'dimension', 'norm', 'vector')
+        student_ids = []
+        norms = []
+        buffers = []
+        dimension = None
+        for student_id, row_dimension, norm, vector in rows.iterator(chunk_size=2000):
+            if dimension is None:
+                dimension = row_dimension
+            if row_dimension != dimension:
+                print(f"Skipping embedding of student {student_id}: dimension {row_dimension} != {dimension}")
+                continue
+            student_ids.append(student_id)
+            norms.append(norm)
+            buffers.append(bytes(vector))
+        
+        return (
+            decode_vectors(buffers, dimension or 0),
+            np.asarray(norms, dtype=np.float32),
+            np.asarray(student_ids, dtype=np.int64)
+        )
+    
+    def __str__(self):
+        return f"{self.student} - {self.model_name} ({self.dimension})"
+
 class Schedule(models.Model):
     DAY_CHOICES = [
         ('Monday', 'Monday'),
@@ -58,10 +114,33 @@ class Attendance(models.Model):
     
     class Meta:
         unique_together = ['student', 'date']
+        indexes = [
+            # Live status: counts per status and recent arrivals of a day
+            models.Index(fields=['date', 'status'], name='attendance_date_status_idx'),
+            models.Index(fields=['date', 'arrival_time'], name='attendance_date_arrival_idx'),
+            # Report date ranges and their (date, id) keyset pages
+            models.Index(fields=['date', 'id'], name='attendance_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student} - {self.date} - {self.status}"
 
+class DailyAttendanceSummary(models.Model):
+    """Attendance counts of one day for one group and faculty, kept in step with Attendance by rollups"""
+    date = models.DateField()
+    group = models.CharField(max_length=50)
+    faculty = models.CharField(max_length=100)
+    present = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    mean_probability = models.FloatField(default=0.0)  # Mean recognition probability of present and late rows
+    
+    class Meta:
+        unique_together = ['date', 'group', 'faculty']
+    
+    def __str__(self):
+        return f"{self.date} - {self.group} ({self.faculty})"
+
 class Contact(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
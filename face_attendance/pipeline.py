@@ -0,0 +1,226 @@
+import collections
+import itertools
+import numpy as np
+from django.conf import settings
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Intersection over union of every (x, y, w, h) box in boxes_a against boxes_b"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2[:, None], bx2) - np.maximum(a[:, 0, None], b[:, 0]), 0, None)
+    inter_h = np.clip(np.minimum(ay2[:, None], by2) - np.maximum(a[:, 1, None], b[:, 1]), 0, None)
+    intersection = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + b[:, 2] * b[:, 3] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+
+class FaceTrack:
+    """A face followed across frames
+
+    Recognition results are votes; an identity is committed only once it
+    has min_votes among the last vote_window results and leads every other
+    identity, or a single match reaches confirm_similarity.
+    """
+
+    def __init__(self, track_id, box, min_votes=3, confirm_similarity=0.8, vote_window=10):
+        self.id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.velocity = np.zeros(4, dtype=np.float32)  # Box change per frame, used between detections
+        self.student_id = None
+        self.similarity = 0.0
+        self.confirmed = False  # Confirmed tracks are not embedded again
+        self.misses = 0  # Consecutive detection cycles without a matching detection
+        self.min_votes = min_votes
+        self.confirm_similarity = confirm_similarity
+        self.votes = collections.deque(maxlen=vote_window)  # (student_id or None, similarity)
+
+    def update(self, box, frames_elapsed):
+        box = np.asarray(box, dtype=np.float32)
+        if frames_elapsed > 0:
+            self.velocity = 0.5 * self.velocity + 0.5 * (box - np.asarray(self.box, dtype=np.float32)) / frames_elapsed
+        self.box = tuple(int(v) for v in box)
+        self.misses = 0
+
+    def predict(self):
+        """Advance the box by one frame between detections"""
+        box = np.asarray(self.box, dtype=np.float32) + self.velocity
+        self.box = tuple(int(v) for v in box)
+
+    def identify(self, student_id, similarity):
+        """Add a recognition vote; returns True when the track becomes confirmed"""
+        if self.confirmed:
+            return False
+        self.votes.append((student_id, similarity))
+
+        counts = collections.Counter(vote for vote, _ in self.votes)
+        best = max((candidate for candidate in counts if candidate), key=lambda c: counts[c], default=None)
+        if best is None:
+            return False
+        leads = all(counts[best] > count for candidate, count in counts.items() if candidate != best)
+        if (counts[best] >= self.min_votes and leads) or (student_id == best and similarity >= self.confirm_similarity):
+            self.student_id = best
+            self.similarity = max(score for vote, score in self.votes if vote == best)
+            self.confirmed = True
+            return True
+        return False
+
+class FaceTracker:
+    """Greedy IoU association of detections to tracks"""
+
+    def __init__(self, iou_threshold=0.3, max_misses=2, **track_options):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.track_options = track_options  # Voting options of new tracks
+        self.tracks = []
+        self.track_ids = itertools.count(1)
+
+    def predict(self):
+        for track in self.tracks:
+            track.predict()
+
+    def update(self, boxes, frames_elapsed):
+        """Associate detected boxes with tracks, returning the track of each box"""
+        assigned = [None] * len(boxes)
+        unmatched_tracks = set(range(len(self.tracks)))
+
+        if self.tracks and boxes:
+            ious = iou_matrix([track.box for track in self.tracks], boxes)
+            # Take the best remaining (track, box) pair until none overlaps enough
+            for flat_idx in np.argsort(-ious, axis=None):
+                track_idx, box_idx = np.unravel_index(flat_idx, ious.shape)
+                if ious[track_idx, box_idx] < self.iou_threshold:
+                    break
+                if track_idx not in unmatched_tracks or assigned[box_idx] is not None:
+                    continue
+                track = self.tracks[track_idx]
+                track.update(boxes[box_idx], frames_elapsed)
+                assigned[box_idx] = track
+                unmatched_tracks.discard(track_idx)
+
+        for track_idx in unmatched_tracks:
+            self.tracks[track_idx].misses += 1
+
+        for box_idx, box in enumerate(boxes):
+            if assigned[box_idx] is None:
+                track = FaceTrack(next(self.track_ids), box, **self.track_options)
+                self.tracks.append(track)
+                assigned[box_idx] = track
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return assigned
+
+
+class TrackingPipeline:
+    """Detect every Nth frame, track faces in between and only embed new or unconfirmed tracks
+
+    Exposes process_frame like FaceRecognitionService so gen_frames can use either.
+    """
+
+    def __init__(self, service, detect_every=None, iou_threshold=None, max_misses=None):
+        self.service = service
+        self.detect_every = max(1, detect_every or getattr(settings, 'FACE_DETECT_EVERY_N_FRAMES', 5))
+        self.tracker = FaceTracker(
+            iou_threshold=iou_threshold or getattr(settings, 'FACE_TRACK_IOU_THRESHOLD', 0.3),
+            max_misses=max_misses if max_misses is not None else getattr(settings, 'FACE_TRACK_MAX_MISSES', 2),
+            min_votes=getattr(settings, 'FACE_TRACK_MIN_VOTES', 3),
+            confirm_similarity=getattr(settings, 'FACE_TRACK_CONFIRM_SIMILARITY', 0.8),
+            vote_window=getattr(settings, 'FACE_TRACK_VOTE_WINDOW', 10)
+        )
+        self.frame_index = 0
+        self.last_detection_frame = 0
+
+    def process_frame(self, frame):
+        """Process a video frame, running detection and recognition only when due"""
+        service = self.service
+        self.frame_index += 1
+
+        if self.frame_index == 1 or self.frame_index - self.last_detection_frame >= self.detect_every:
+            self.detect_and_recognize(frame)
+        else:
+            with service.timings.measure('tracking'):
+                self.tracker.predict()
+
+        for track in self.tracker.tracks:
+            if track.misses == 0 or track.confirmed:
+                service.annotate_face(frame, track.box, track.student_id if track.confirmed else None, track.similarity)
+
+        service.timings.count_frame()
+        return frame
+
+    def detect_and_recognize(self, frame):
+        service = self.service
+        frames_elapsed = self.frame_index - self.last_detection_frame
+        self.last_detection_frame = self.frame_index
+
+        if service.worker_pool is not None:
+            # Worker processes detect every face but skip embedding those on confirmed tracks
+            confirmed = [track.box for track in self.tracker.tracks if track.confirmed]
+            boxes, frame_embeddings = service.detect_and_embed(frame, confirmed, self.tracker.iou_threshold)
+            with service.timings.measure('tracking'):
+                tracks = self.tracker.update(boxes, frames_elapsed)
+            pending = []
+            embeddings = []
+            for track, embedding in zip(tracks, frame_embeddings):
+                # A skipped face that went to an unconfirmed track gets its embedding next cycle
+                if not track.confirmed and embedding is not None:
+                    pending.append(track)
+                    embeddings.append(embedding)
+            self.recognize(pending, embeddings)
+            return
+
+        with service.timings.measure('detection'):
+            faces = service.extract_faces(frame)
+
+        crops = []
+        boxes = []
+        aligned = []
+        for face in faces:
+            parsed = service.parse_face(face)
+            if parsed is None:
+                continue
+            crops.append(parsed[0])
+            boxes.append(parsed[1])
+            aligned.append(isinstance(face, dict))
+
+        with service.timings.measure('tracking'):
+            tracks = self.tracker.update(boxes, frames_elapsed)
+
+        # Only new and still unidentified tracks need the embedding model
+        todo = [i for i, track in enumerate(tracks) if not track.confirmed]
+        results = service.get_embeddings([crops[i] for i in todo], [aligned[i] for i in todo])
+        pending = []
+        embeddings = []
+        for i, embedding in zip(todo, results):
+            if embedding is not None:
+                pending.append(tracks[i])
+                embeddings.append(embedding)
+        self.recognize(pending, embeddings)
+
+    def recognize(self, pending, embeddings):
+        """Vote with the matches of unconfirmed tracks and record the students they confirm"""
+        service = self.service
+        with service.timings.measure('matching'):
+            matches = service.match_batch(embeddings, k=1)
+
+        for track, candidates in zip(pending, matches):
+            student_id, similarity = None, 0.0
+            if candidates and candidates[0][1] < service.recognition_threshold:
+                student_id = candidates[0][0]
+                similarity = 1 - candidates[0][1]
+            if track.identify(student_id, similarity):
+                # Record the confirmed identity; the deciding vote may have been for someone else
+                service.record_attendance(track.student_id, track.similarity)
+
+
+def build_pipeline(service):
+    """Return the frame processor selected by FACE_PIPELINE_MODE"""
+    mode = getattr(settings, 'FACE_PIPELINE_MODE', 'tracking')
+    if mode == 'every_frame':
+        return service
+    if mode == 'tracking':
+        return TrackingPipeline(service)
+    raise ValueError(f"Unknown face pipeline mode: {mode}")
@@ -0,0 +1,202 @@
+from datetime import date
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from .models import Student, Attendance, DailyAttendanceSummary
+
+REPORT_FILTERS = ('start_date', 'end_date', 'group', 'faculty')
+# Columns shown on the reports page
+REPORT_PAGE_FIELDS = (
+    'date', 'status', 'arrival_time', 'recognition_probability',
+    'student__name', 'student__surname', 'student__faculty', 'student__group',
+)
+
+
+def daily_counts(date):
+    """Counts of one day plus the number of students
+
+    Only the day's rows are read, through the (date, status) index; the
+    total is a plain count of students. Students without a row for the day
+    are counted as absent, matching the live status before stop_attendance
+    writes their Absent rows.
+    """
+    counts = Attendance.objects.filter(date=date).aggregate(
+        present=Count('id', filter=Q(status='Present')),
+        late=Count('id', filter=Q(status='Late')),
+    )
+    counts['total'] = Student.objects.count()
+    counts['absent'] = max(0, counts['total'] - counts['present'] - counts['late'])
+    return counts
+
+
+def _daily_counts_key(date):
+    return f"attendance_status:{date.isoformat()}"
+
+
+def cached_daily_counts(date):
+    """daily_counts, cached for ATTENDANCE_STATUS_CACHE_TTL seconds until attendance of the day is written"""
+    key = _daily_counts_key(date)
+    counts = cache.get(key)
+    if counts is None:
+        counts = daily_counts(date)
+        cache.set(key, counts, getattr(settings, 'ATTENDANCE_STATUS_CACHE_TTL', 5))
+    return counts
+
+
+def invalidate_daily_counts(date):
+    """Drop the cached counts of a day after its attendance changed"""
+    cache.delete(_daily_counts_key(date))
+
+
+def report_filters(params):
+    """Report filters of a request, normalized so equal reports share a cache entry
+
+    Empty values and dates that do not parse as YYYY-MM-DD are left out.
+    """
+    filters = {}
+    for name in REPORT_FILTERS:
+        value = (params.get(name) or '').strip()
+        if not value:
+            continue
+        if name in ('start_date', 'end_date'):
+            try:
+                value = date.fromisoformat(value).isoformat()
+            except ValueError:
+                continue
+        filters[name] = value
+    return filters
+
+
+def report_queryset(filters):
+    """Attendance rows matching normalized report filters"""
+    attendance_records = Attendance.objects.all()
+    if 'start_date' in filters:
+        attendance_records = attendance_records.filter(date__gte=filters['start_date'])
+    if 'end_date' in filters:
+        attendance_records = attendance_records.filter(date__lte=filters['end_date'])
+    if 'group' in filters:
+        attendance_records = attendance_records.filter(student__group=filters['group'])
+    if 'faculty' in filters:
+        attendance_records = attendance_records.filter(student__faculty=filters['faculty'])
+    return attendance_records
+
+
+def _report_key(kind, filters, **extra):
+    # Bumping the version invalidates every cached report at once
+    version = cache.get_or_set('attendance_report:version', 1, None)
+    return f"attendance_report:{version}:{kind}:{urlencode(sorted(dict(filters, **extra).items()))}"
+
+
+def report_counts(filters):
+    """Status counts and mean recognition probability over every row of a report
+
+    Read from the daily summaries, so the cost grows with days x groups rather
+    than with attendance rows; cached for REPORT_CACHE_TTL seconds.
+    """
+    key = _report_key('counts', filters)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    summaries = DailyAttendanceSummary.objects.all()
+    if 'start_date' in filters:
+        summaries = summaries.filter(date__gte=filters['start_date'])
+    if 'end_date' in filters:
+        summaries = summaries.filter(date__lte=filters['end_date'])
+    if 'group' in filters:
+        summaries = summaries.filter(group=filters['group'])
+    if 'faculty' in filters:
+        summaries = summaries.filter(faculty=filters['faculty'])
+    totals = summaries.aggregate(
+        total_present=Sum('present'),
+        total_late=Sum('late'),
+        total_absent=Sum('absent'),
+        # Daily means weighted by the recognized rows they were taken over
+        total_probability=Sum(F('mean_probability') * (F('present') + F('late'))),
+    )
+
+    present, late = totals['total_present'] or 0, totals['total_late'] or 0
+    counts = {
+        'present': present,
+        'late': late,
+        'absent': totals['total_absent'] or 0,
+        'mean_probability': round(totals['total_probability'] / (present + late), 2) if present + late else 0.0,
+    }
+    cache.set(key, counts, getattr(settings, 'REPORT_CACHE_TTL', 300))
+    return counts
+
+
+def encode_cursor(row):
+    return f"{row['date'].isoformat()}_{row['id']}"
+
+
+def decode_cursor(cursor):
+    """(date, id) of a page cursor, or None if it is missing or malformed"""
+    try:
+        day, row_id = cursor.split('_')
+        return date.fromisoformat(day), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def report_page(filters, after=None, before=None, page_size=50):
+    """One page of report rows, newest first, with keyset pagination on (date, id)
+
+    after and before are cursors of the last row of the previous page and
+    the first row of the next page; each page is one indexed range query no
+    matter how deep it is. Rows are dicts shaped like Attendance instances
+    (record.student.name works in templates), read with values() and cached
+    for REPORT_CACHE_TTL seconds.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    key = _report_key('page', filters, after=after or '', before=before or '', size=page_size)
+    page = cache.get(key)
+    if page is not None:
+        return page
+
+    attendance_records = report_queryset(filters).values('id', *REPORT_PAGE_FIELDS)
+    if before is not None:
+        # Walk towards newer rows, then flip the page back to newest first
+        day, row_id = before
+        rows = list(attendance_records.filter(Q(date__gt=day) | Q(date=day, id__gt=row_id)).order_by('date', 'id')[:page_size + 1])
+        has_newer, has_older = len(rows) > page_size, True
+        rows = rows[:page_size][::-1]
+    else:
+        if after is not None:
+            day, row_id = after
+            attendance_records = attendance_records.filter(Q(date__lt=day) | Q(date=day, id__lt=row_id))
+        rows = list(attendance_records.order_by('-date', '-id')[:page_size + 1])
+        has_newer, has_older = after is not None, len(rows) > page_size
+        rows = rows[:page_size]
+
+    page = {
+        'records': [
+            {
+                'id': row['id'],
+                'date': row['date'],
+                'status': row['status'],
+                'arrival_time': row['arrival_time'],
+                'recognition_probability': row['recognition_probability'],
+                'student': {
+                    'name': row['student__name'],
+                    'surname': row['student__surname'],
+                    'faculty': row['student__faculty'],
+                    'group': row['student__group'],
+                },
+            }
+            for row in rows
+        ],
+        'next_cursor': encode_cursor(rows[-1]) if rows and has_older else None,
+        'previous_cursor': encode_cursor(rows[0]) if rows and has_newer else None,
+    }
+    cache.set(key, page, getattr(settings, 'REPORT_CACHE_TTL', 300))
+    return page
+
+
+def invalidate_reports():
+    """Drop every cached report after attendance or students changed"""
+    try:
+        cache.incr('attendance_report:version')
+    except ValueError:
+        pass  # No report has been cached yet
@@ -0,0 +1,205 @@
+import threading
+from collections import defaultdict
+from datetime import datetime
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .models import Student, Attendance
+from .events import attendance_events
+from .queries import invalidate_daily_counts, invalidate_reports
+from .rollups import refresh_days
+
+
+class AttendanceRecorder:
+    """Debounces attendance writes coming from the recognition loop
+
+    Each student's first-seen time and best probability of the day are kept
+    in memory. Only a first sighting or an improvement of at least
+    min_improvement percentage points marks a student as dirty, and dirty
+    students are written in bulk every flush_interval seconds.
+    """
+
+    def __init__(self, flush_interval=2.0, min_improvement=5.0, batch_size=500):
+        self.flush_interval = flush_interval
+        self.min_improvement = min_improvement
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # One flush at a time, timer or explicit
+        self.seen = {}  # (date, student_id) -> {'arrival_time', 'status', 'probability', 'written'}
+        self.dirty = set()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.sightings = 0
+        self.created = 0
+        self.updated = 0
+        self.flushes = 0
+        self.late_after = None  # Arrivals after this datetime are recorded as Late
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stop_event.clear()
+                self.thread = threading.Thread(target=self._run, name='attendance-recorder', daemon=True)
+                self.thread.start()
+        return self
+
+    def record(self, student_id, probability):
+        """Note a recognized student; probability is in [0, 1]"""
+        now = datetime.now()
+        probability = probability * 100  # Stored as a percentage
+        key = (now.date(), student_id)
+
+        with self.lock:
+            self.sightings += 1
+            entry = self.seen.get(key)
+            if entry is None:
+                status = 'Late' if self.late_after is not None and now > self.late_after else 'Present'
+                self.seen[key] = {'arrival_time': now.time(), 'status': status, 'probability': probability, 'written': None}
+                self.dirty.add(key)
+            elif probability > entry['probability']:
+                entry['probability'] = probability
+                if entry['written'] is not None and probability - entry['written'] >= self.min_improvement:
+                    self.dirty.add(key)
+
+    def flush(self):
+        """Write pending sightings to the database, returning the number of students written"""
+        with self.flush_lock:
+            with self.lock:
+                pending = {key: dict(self.seen[key]) for key in self.dirty}
+                self.dirty.clear()
+            if not pending:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    created = self._write(pending)
+            except Exception as e:
+                print(f"Error recording attendance: {e}")
+                with self.lock:
+                    self.dirty.update(pending)  # Retry with the next flush
+                return 0
+
+            today = datetime.now().date()
+            with self.lock:
+                for key, entry in pending.items():
+                    if key in self.seen:
+                        self.seen[key]['written'] = entry['probability']
+                # Sightings of previous days are no longer needed once written
+                for key in [key for key in self.seen if key[0] != today and key not in self.dirty]:
+                    del self.seen[key]
+                self.flushes += 1
+
+            try:
+                refresh_days(date for date, _ in pending)
+                invalidate_reports()
+                # Dashboards learn about new arrivals without querying the database
+                for date, records in created.items():
+                    invalidate_daily_counts(date)
+                    attendance_events.attendance_recorded(date, records)
+            except Exception as e:
+                # The rows are committed; the next write of the day or backfill_daily_summaries rebuilds the summary
+                print(f"Error publishing recorded attendance: {e}")
+            return len(pending)
+
+    def _write(self, pending):
+        """Write pending sightings, returning the created rows as {date: [(student, status, arrival_time, probability)]}"""
+        created = {}
+        by_date = defaultdict(dict)
+        for (date, student_id), entry in pending.items():
+            by_date[date][student_id] = entry
+
+        for date, entries in by_date.items():
+            existing = Attendance.objects.filter(date=date, student_id__in=list(entries)).only(
+                'id', 'student_id', 'recognition_probability'
+            )
+            updates = []
+            seen_ids = set()
+            for attendance in existing:
+                seen_ids.add(attendance.student_id)
+                # Update probability if higher
+                probability = entries[attendance.student_id]['probability']
+                if attendance.recognition_probability < probability:
+                    attendance.recognition_probability = probability
+                    updates.append(attendance)
+
+            # Students deleted since they were seen would fail the foreign key
+            students = Student.objects.filter(id__in=set(entries) - seen_ids).only('id', 'name', 'surname')
+            creates = [
+                Attendance(
+                    student=student,
+                    date=date,
+                    status=entries[student.id]['status'],
+                    arrival_time=entries[student.id]['arrival_time'],
+                    recognition_probability=entries[student.id]['probability']
+                )
+                for student in students
+            ]
+
+            # Another process may have inserted the same (student, date) meanwhile
+            Attendance.objects.bulk_create(creates, batch_size=self.batch_size, ignore_conflicts=True)
+            if creates:
+                # Skipped rows are that process's to announce; ours carry our arrival time
+                stored = dict(Attendance.objects.filter(
+                    date=date, student_id__in=[attendance.student_id for attendance in creates]
+                ).values_list('student_id', 'arrival_time'))
+                creates = [attendance for attendance in creates if stored.get(attendance.student_id) == attendance.arrival_time]
+            Attendance.objects.bulk_update(updates, ['recognition_probability'], batch_size=self.batch_size)
+            self.created += len(creates)
+            self.updated += len(updates)
+            created[date] = [
+                (attendance.student, attendance.status, attendance.arrival_time, attendance.recognition_probability)
+                for attendance in creates
+            ]
+        return created
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self._flush_safely()
+        self._flush_safely()
+
+    def _flush_safely(self):
+        # One failed flush must not stop the timer
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing attendance: {e}")
+        finally:
+            close_old_connections()
+
+    def stop(self):
+        """Stop the timer after a final flush"""
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5.0)
+
+    def stats(self):
+        """Sightings received against rows actually written"""
+        with self.lock:
+            return {
+                'sightings': self.sightings,
+                'pending': len(self.dirty),
+                'created': self.created,
+                'updated': self.updated,
+                'flushes': self.flushes,
+            }
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_attendance_recorder():
+    """Return the process-wide attendance recorder, starting its flush timer on first use"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = AttendanceRecorder(
+                    flush_interval=getattr(settings, 'ATTENDANCE_FLUSH_INTERVAL', 2.0),
+                    min_improvement=getattr(settings, 'ATTENDANCE_MIN_IMPROVEMENT', 5.0)
+                ).start()
+    return _recorder
+
+
+def get_running_recorder():
+    """Return the recorder if it has been started, without starting it"""
+    return _recorder
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q
+from .models import Attendance, DailyAttendanceSummary
+
+
+def summary_rows(attendance_records):
+    """Per (date, group, faculty) counts of an Attendance queryset, from one GROUP BY query"""
+    return attendance_records.values(
+        'date', group=F('student__group'), faculty=F('student__faculty')
+    ).annotate(
+        present=Count('id', filter=Q(status='Present')),
+        late=Count('id', filter=Q(status='Late')),
+        absent=Count('id', filter=Q(status='Absent')),
+        mean_probability=Avg('recognition_probability', filter=~Q(status='Absent')),
+    ).order_by()
+
+
+def _rebuild(attendance_records, summaries, batch_size):
+    with transaction.atomic():
+        # Groups that no longer have rows on a day lose their summary too
+        summaries.delete()
+        rows = [
+            DailyAttendanceSummary(**dict(row, mean_probability=row['mean_probability'] or 0.0))
+            for row in summary_rows(attendance_records)
+        ]
+        DailyAttendanceSummary.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_summaries(start=None, end=None, batch_size=1000):
+    """Recompute the daily summaries between start and end (inclusive, all days by default)
+
+    Returns the number of summary rows written.
+    """
+    attendance_records = Attendance.objects.all()
+    summaries = DailyAttendanceSummary.objects.all()
+    if start is not None:
+        attendance_records = attendance_records.filter(date__gte=start)
+        summaries = summaries.filter(date__gte=start)
+    if end is not None:
+        attendance_records = attendance_records.filter(date__lte=end)
+        summaries = summaries.filter(date__lte=end)
+    return _rebuild(attendance_records, summaries, batch_size)
+
+
+def refresh_days(dates, batch_size=1000):
+    """Recompute the summaries of the given days after their attendance changed
+
+    Days are rebuilt batch_size at a time, each batch with one GROUP BY.
+    """
+    dates = sorted(set(dates))
+    written = 0
+    for i in range(0, len(dates), batch_size):
+        batch = dates[i:i + batch_size]
+        written += _rebuild(
+            Attendance.objects.filter(date__in=batch), DailyAttendanceSummary.objects.filter(date__in=batch), batch_size
+        )
+    return written
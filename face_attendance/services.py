@@ -1,196 +1,385 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
-from datetime import datetime
 import os
 import tempfile
-from .models import Student, Attendance
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+from .models import Student, StudentEmbedding
+from .embeddings import to_vector, normalize_rows, decode_vectors
+from .indexes import build_index
+from .snapshot import load_snapshot
+from .metrics import StageTimings
+from . import model_registry
+from .inference import get_batcher
+from .workers import get_worker_pool
+from .recorder import get_attendance_recorder
+
+def parse_face(face):
+    """Return (face_img, (x, y, w, h)) for an extract_faces result, or None"""
+    # In newer versions, the structure might be different
+    # Check if face is a dictionary with 'face' and 'facial_area' keys
+    if isinstance(face, dict) and 'face' in face and 'facial_area' in face:
+        face_img = face["face"]
+        facial_area = face["facial_area"]
+    
+        # Get coordinates
+        if isinstance(facial_area, dict):
+            x = facial_area.get("x", 0)
+            y = facial_area.get("y", 0)
+            w = facial_area.get("w", 0)
+            h = facial_area.get("h", 0)
+        else:
+            # If facial_area is not a dict, it might be a list or tuple [x, y, w, h]
+            try:
+                x, y, w, h = facial_area
+            except:
+                # Fallback
+                x, y, w, h = 0, 0, 0, 0
+    else:
+        # If the structure is different, try to adapt
+        try:
+            # It might be a tuple of (face_img, [x, y, w, h])
+            if isinstance(face, tuple) and len(face) == 2:
+                face_img, facial_area = face
+                x, y, w, h = facial_area
+            else:
+                # Just use the face as is
+                face_img = face
+                x, y, w, h = 0, 0, 100, 100  # Default values
+        except:
+            # Skip this face if we can't process it
+            return None
+    
+    return face_img, (x, y, w, h)
 
 class FaceRecognitionService:
     def __init__(self):
-        self.known_face_embeddings = []
-        self.known_face_student_ids = []
+        self.index_backend = getattr(settings, 'FACE_INDEX_BACKEND', 'flat')
+        self.index_options = getattr(settings, 'FACE_INDEX_OPTIONS', {})
+        self.index = build_index(self.index_backend, **self.index_options)
+        self.lock = threading.RLock()  # Guards the index against concurrent gallery updates
+        self.snapshot_path = getattr(settings, 'FACE_GALLERY_SNAPSHOT', None)
         self.student_data = {}
-        self.model_name = "VGG-Face"  # Default model in DeepFace
-        self.detector_backend = "opencv"  # Faster than MTCNN but still accurate
+        self.model_name = model_registry.MODEL_NAME  # VGG-Face by default
+        self.detector_backend = model_registry.DETECTOR_BACKEND  # OpenCV is faster than MTCNN but still accurate
         self.distance_metric = "cosine"
         self.recognition_threshold = 0.4  # Threshold for face recognition (lower is stricter)
+        # Crops from extract_faces are already detected and aligned, so embedding them skips detection
+        self.skip_redundant_detection = getattr(settings, 'FACE_EMBEDDING_SKIP_DETECTION', True)
+        # Send aligned crops through the shared micro-batching stage instead of one model call each
+        self.batch_inference = getattr(settings, 'FACE_BATCH_INFERENCE', True)
+        self.timings = StageTimings()
+        # Detection and embedding run in worker processes when FACE_WORKER_PROCESSES > 0
+        self.worker_pool = get_worker_pool()
+        self.worker_timeout = getattr(settings, 'FACE_WORKER_TIMEOUT', 30.0)
+        self.recorder = get_attendance_recorder()
         self.load_student_data()
     
     def load_student_data(self):
         """Load student data from the database"""
-        self.known_face_embeddings = []
-        self.known_face_student_ids = []
-        self.student_data = {}
+        self.student_data = {
+            student['id']: {
+                'name': student['name'],
+                'surname': student['surname'],
+                'faculty': student['faculty'],
+                'group': student['group']
+            }
+            for student in Student.objects.values('id', 'name', 'surname', 'faculty', 'group')
+        }
         
-        students = Student.objects.all()
-        for student in students:
-            try:
-                embeddings = student.get_face_embeddings()
-                for embedding in embeddings:
-                    self.known_face_embeddings.append(embedding)
-                    self.known_face_student_ids.append(student.id)
-                
-                self.student_data[student.id] = {
-                    'name': student.name,
-                    'surname': student.surname,
-                    'faculty': student.faculty,
-                    'group': student.group
-                }
-            except Exception as e:
-                print(f"Error loading student {student.id}: {e}")
+        index = build_index(self.index_backend, **self.index_options)
+        
+        # Workers share one memory-mapped snapshot when it matches the database
+        snapshot = load_snapshot(self.snapshot_path, self.model_name) if self.snapshot_path else None
+        if snapshot is not None:
+            index.add_units(*snapshot)
+        else:
+            # Stored vectors are already normalized float32, so they are decoded straight into the index
+            index.add_units(*StudentEmbedding.load_gallery(self.model_name))
+        with self.lock:
+            self.index = index
+    
+    def add_student_embeddings(self, student):
+        """Add or refresh one student in the in-memory gallery without a full reload"""
+        rows = list(student.embeddings.filter(model_name=self.model_name).values_list('dimension', 'norm', 'vector'))
+        dimension = rows[0][0] if rows else 0
+        
+        with self.lock:
+            if len(self.index) and dimension and dimension != self.index.dim:
+                print(f"Skipping embeddings of student {student.id}: dimension {dimension} != {self.index.dim}")
+                rows = []
+            
+            self.index.remove(student.id)
+            self.index.add_units(
+                decode_vectors([bytes(row[2]) for row in rows], dimension),
+                [row[1] for row in rows],
+                [student.id] * len(rows)
+            )
+            self.student_data[student.id] = {
+                'name': student.name,
+                'surname': student.surname,
+                'faculty': student.faculty,
+                'group': student.group
+            }
+    
+    def remove_student(self, student_id):
+        """Remove one student from the in-memory gallery without a full reload"""
+        with self.lock:
+            self.index.remove(student_id)
+            self.student_data.pop(student_id, None)
     
     def extract_faces(self, img):
-        """Extract faces from an image using DeepFace"""
+        """Extract faces from an image using the shared detector"""
         try:
-            # Use DeepFace.extract_faces instead of functions.extract_faces
-            faces = DeepFace.extract_faces(
-                img_path=img,
-                detector_backend=self.detector_backend,
-                enforce_detection=False
-            )
-            return faces
+            return model_registry.extract_faces(img, detector_backend=self.detector_backend)
         except Exception as e:
             print(f"Error extracting faces: {e}")
             return []
     
-    def get_embedding(self, face_img):
-        """Get face embedding using DeepFace"""
+    def get_embedding(self, face_img, aligned=False):
+        """Get face embedding using the shared recognition model
+        
+        aligned=True means face_img is a crop returned by extract_faces, so the
+        detector is skipped instead of being run a second time on the crop.
+        """
         try:
-            embedding = DeepFace.represent(
-                img_path=face_img,
-                model_name=self.model_name,
-                detector_backend=self.detector_backend,
-                enforce_detection=False
-            )
-            return embedding
+            if aligned and self.skip_redundant_detection:
+                # extract_faces returns RGB in [0, 1]; the model expects the BGR channel order
+                return model_registry.represent(face_img[:, :, ::-1], detector_backend="skip")
+            return model_registry.represent(face_img, detector_backend=self.detector_backend)
         except Exception as e:
             print(f"Error getting embedding: {e}")
             return None
     
+    def get_embeddings(self, face_imgs, aligned):
+        """Embed several face crops, batching aligned crops with those of other frames and cameras"""
+        start = time.perf_counter()
+        embeddings = [None] * len(face_imgs)
+        batcher = get_batcher() if self.batch_inference and self.skip_redundant_detection else None
+        
+        futures = {}
+        for i, (face_img, is_aligned) in enumerate(zip(face_imgs, aligned)):
+            if is_aligned and batcher is not None:
+                # extract_faces returns RGB in [0, 1]; the model expects the BGR channel order
+                futures[i] = batcher.submit(face_img[:, :, ::-1])
+            else:
+                embeddings[i] = self.get_embedding(face_img, aligned=is_aligned)
+        
+        for i, future in futures.items():
+            try:
+                embeddings[i] = future.result(timeout=30)
+            except Exception as e:
+                print(f"Error getting embedding: {e}")
+        
+        if face_imgs:
+            self.timings.add('embedding', time.perf_counter() - start, calls=len(face_imgs))
+        return embeddings
+    
     def find_closest_match(self, embedding):
         """Find the closest match for a face embedding"""
-        if not self.known_face_embeddings:
+        candidates = self.match_batch([embedding], k=1)[0]
+        if not candidates:
             return None, 0.0
         
-        # Calculate distances to all known embeddings
-        distances = []
-        for known_embedding in self.known_face_embeddings:
-            if self.distance_metric == "cosine":
-                # Use numpy's cosine distance
-                similarity = np.dot(embedding, known_embedding) / (np.linalg.norm(embedding) * np.linalg.norm(known_embedding))
-                distance = 1 - similarity
-            elif self.distance_metric == "euclidean":
-                # Use numpy's euclidean distance
-                distance = np.linalg.norm(embedding - known_embedding)
-            else:
-                # Default to euclidean
-                distance = np.linalg.norm(embedding - known_embedding)
-            distances.append(distance)
-        
-        # Find the closest match
-        min_distance_idx = np.argmin(distances)
-        min_distance = distances[min_distance_idx]
+        student_id, min_distance = candidates[0]
         
         # Check if the distance is below the threshold
         if min_distance < self.recognition_threshold:
-            student_id = self.known_face_student_ids[min_distance_idx]
             # Convert distance to similarity (1 - distance)
             similarity = 1 - min_distance
             return student_id, similarity
         
         return None, 0.0
     
-    def process_frame(self, frame):
-        """Process a video frame and recognize faces"""
+    def match_batch(self, embeddings, k=1):
+        """Return the top-k (student_id, distance) candidates for each embedding"""
+        with self.lock:
+            return self._match_batch(self.index, embeddings, k)
+    
+    def _match_batch(self, index, embeddings, k):
+        results = [[] for _ in embeddings]
+        if len(index) == 0 or not embeddings:
+            return results
+        
+        # Keep only embeddings that can be compared against the gallery
+        rows = []
+        vectors = []
+        for i, embedding in enumerate(embeddings):
+            vector = to_vector(embedding)
+            if vector is not None and vector.shape[0] == index.dim:
+                rows.append(i)
+                vectors.append(vector)
+        if not vectors:
+            return results
+        
+        query_units, query_norms = normalize_rows(np.vstack(vectors))
+        
+        # A student owns several rows, so the best k * rows_per_student rows always
+        # contain the best row of each of the top-k students
+        n_candidates = k * index.max_rows_per_student()
+        nearest = index.search(query_units, query_norms, n_candidates, self.distance_metric)
+        
+        for query_idx, query_norm, (gallery_rows, distances) in zip(rows, query_norms, nearest):
+            if query_norm == 0:
+                continue
+            seen = set()
+            for gallery_idx, distance in zip(gallery_rows, distances):
+                student_id = int(index.student_ids[gallery_idx])
+                if student_id in seen:
+                    continue
+                seen.add(student_id)
+                results[query_idx].append((student_id, float(distance)))
+                if len(seen) == k:
+                    break
+        
+        return results
+    
+    def parse_face(self, face):
+        """Return (face_img, (x, y, w, h)) for an extract_faces result, or None"""
+        return parse_face(face)
+    
+    def annotate_face(self, frame, box, student_id, similarity):
+        """Draw the bounding box and label for a face"""
+        x, y, w, h = box
+        
+        # Draw rectangle and name
+        if student_id:
+            student_data = self.student_data[student_id]
+            name = f"{student_data['name']} {student_data['surname']}"
+            color = (0, 255, 0)  # Green for recognized
+        else:
+            name = "Unknown"
+            color = (0, 0, 255)  # Red for unknown
+            similarity = 0.0
+        
+        # Draw rectangle around face
+        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+        
+        # Draw label with name
+        label = f"{name} ({similarity:.2%})"
+        cv2.rectangle(frame, (x, y+h), (x+w, y+h+30), color, cv2.FILLED)
+        cv2.putText(frame, label, (x+6, y+h+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    
+    def detect_and_embed(self, frame, skip_boxes=(), skip_iou=0.3):
+        """Detect the faces of a frame and embed them, returning (boxes, embeddings)
+        
+        The worker pool does not embed faces overlapping skip_boxes (see
+        RecognitionWorkerPool.submit); inline, every face is embedded.
+        """
+        if self.worker_pool is not None:
+            return self.submit_frame(frame, skip_boxes, skip_iou).result(timeout=self.worker_timeout)
+        
         # Extract faces from the frame
-        faces = self.extract_faces(frame)
+        with self.timings.measure('detection'):
+            faces = self.extract_faces(frame)
         
+        crops = []
+        crop_boxes = []
+        aligned = []
         for face in faces:
-            # In newer versions, the structure might be different
-            # Check if face is a dictionary with 'face' and 'facial_area' keys
-            if isinstance(face, dict) and 'face' in face and 'facial_area' in face:
-                face_img = face["face"]
-                facial_area = face["facial_area"]
+            parsed = parse_face(face)
+            if parsed is None:
+                continue
+            crops.append(parsed[0])
+            crop_boxes.append(parsed[1])
+            aligned.append(isinstance(face, dict))
+        
+        # Get embeddings for the already detected faces
+        boxes = []
+        embeddings = []
+        for box, embedding in zip(crop_boxes, self.get_embeddings(crops, aligned)):
+            if embedding is not None:
+                boxes.append(box)
+                embeddings.append(embedding)
+        return boxes, embeddings
+    
+    def submit_frame(self, frame, skip_boxes=(), skip_iou=0.3):
+        """Start detection and embedding of a frame; the Future resolves to (boxes, embeddings)
+        
+        With FACE_WORKER_PROCESSES the work runs in the worker pool, otherwise inline.
+        """
+        if self.worker_pool is None:
+            future = Future()
+            try:
+                future.set_result(self.detect_and_embed(frame))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        start = time.perf_counter()
+        future = self.worker_pool.submit(frame, skip_boxes, skip_iou)
+        future.add_done_callback(lambda _: self.timings.add('workers', time.perf_counter() - start))
+        return future
+    
+    def finish_frame(self, frame, boxes, embeddings):
+        """Match detected faces, record attendance and annotate the frame"""
+        # Match every face in the frame against the gallery at once
+        with self.timings.measure('matching'):
+            matches = self.match_batch(embeddings, k=1)
+        self.timings.count_frame()
+        
+        for box, candidates in zip(boxes, matches):
+            student_id, similarity = None, 0.0
+            if candidates and candidates[0][1] < self.recognition_threshold:
+                student_id = candidates[0][0]
+                similarity = 1 - candidates[0][1]
                 
-                # Get coordinates
-                if isinstance(facial_area, dict):
-                    x = facial_area.get("x", 0)
-                    y = facial_area.get("y", 0)
-                    w = facial_area.get("w", 0)
-                    h = facial_area.get("h", 0)
-                else:
-                    # If facial_area is not a dict, it might be a list or tuple [x, y, w, h]
-                    try:
-                        x, y, w, h = facial_area
-                    except:
-                        # Fallback
-                        x, y, w, h = 0, 0, 0, 0
-            else:
-                # If the structure is different, try to adapt
-                try:
-                    # It might be a tuple of (face_img, [x, y, w, h])
-                    if isinstance(face, tuple) and len(face) == 2:
-                        face_img, facial_area = face
-                        x, y, w, h = facial_area
-                    else:
-                        # Just use the face as is
-                        face_img = face
-                        x, y, w, h = 0, 0, 100, 100  # Default values
-                except:
-                    # Skip this face if we can't process it
-                    continue
-            
-            # Get embedding for the face
-            embedding = self.get_embedding(face_img)
+                # Record attendance
+                self.record_attendance(student_id, similarity)
             
-            if embedding:
-                # Find the closest match
-                student_id, similarity = self.find_closest_match(embedding)
-                
-                # Draw rectangle and name
-                if student_id:
-                    student_data = self.student_data[student_id]
-                    name = f"{student_data['name']} {student_data['surname']}"
-                    color = (0, 255, 0)  # Green for recognized
-                    
-                    # Record attendance
-                    self.record_attendance(student_id, similarity)
-                else:
-                    name = "Unknown"
-                    color = (0, 0, 255)  # Red for unknown
-                    similarity = 0.0
-                
-                # Draw rectangle around face
-                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                
-                # Draw label with name
-                label = f"{name} ({similarity:.2%})"
-                cv2.rectangle(frame, (x, y+h), (x+w, y+h+30), color, cv2.FILLED)
-                cv2.putText(frame, label, (x+6, y+h+20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            self.annotate_face(frame, box, student_id, similarity)
         
         return frame
     
+    def process_frame(self, frame):
+        """Process a video frame and recognize faces"""
+        boxes, embeddings = self.detect_and_embed(frame)
+        return self.finish_frame(frame, boxes, embeddings)
+    
+    def process_frame_async(self, frame):
+        """Drop-in asynchronous process_frame; the Future resolves to the annotated frame
+        
+        Detection and embedding run in the worker pool when one is configured,
+        so the calling process only matches, annotates and encodes.
+        """
+        result = Future()
+        
+        def finish(detections):
+            try:
+                boxes, embeddings = detections.result()
+                result.set_result(self.finish_frame(frame, boxes, embeddings))
+            except Exception as e:
+                result.set_exception(e)
+        
+        self.submit_frame(frame).add_done_callback(finish)
+        return result
+    
     def record_attendance(self, student_id, probability):
-        """Record attendance for a recognized student"""
-        today = datetime.now().date()
-        current_time = datetime.now().time()
+        """Record attendance for a recognized student
         
+        Sightings are debounced in memory and written in bulk by the recorder.
+        """
         try:
-            # Check if attendance already recorded for today
-            attendance, created = Attendance.objects.get_or_create(
-                student_id=student_id,
-                date=today,
-                defaults={
-                    'status': 'Present',
-                    'arrival_time': current_time,
-                    'recognition_probability': probability * 100  # Convert to percentage
-                }
-            )
-            
-            # If attendance was already recorded, update probability if higher
-            if not created and attendance.recognition_probability < probability * 100:
-                attendance.recognition_probability = probability * 100
-                attendance.save()
+            self.recorder.record(student_id, probability)
         except Exception as e:
-            print(f"Error recording attendance: {e}")
\ No newline at end of file
+            print(f"Error recording attendance: {e}")
+
+
+# Face recognition service shared by the whole process
+face_service = None
+face_service_lock = threading.Lock()
+
+def get_face_service():
+    """Return the process-wide FaceRecognitionService, loading it on first use"""
+    global face_service
+    if face_service is None:
+        with face_service_lock:
+            if face_service is None:
+                face_service = FaceRecognitionService()
+    return face_service
+
+def get_loaded_face_service():
+    """Return the process-wide service if it has been loaded, without loading it"""
+    return face_service
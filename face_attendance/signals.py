@@ -0,0 +1,81 @@
+from datetime import datetime
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Student, Attendance
+from .services import get_loaded_face_service
+from .events import attendance_events
+from .queries import invalidate_daily_counts, invalidate_reports
+from .rollups import refresh_days
+
+
+@receiver(pre_save, sender=Student)
+def student_saving(sender, instance, update_fields=None, **kwargs):
+    """Note whether the save moves the student to another group or faculty, and so to other daily summaries"""
+    instance._summaries_moved = False
+    if instance.pk is None or (update_fields is not None and not {'group', 'faculty'} & set(update_fields)):
+        return
+    stored = Student.objects.filter(pk=instance.pk).values('group', 'faculty').first()
+    instance._summaries_moved = stored is not None and (stored['group'], stored['faculty']) != (instance.group, instance.faculty)
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, **kwargs):
+    """Patch the loaded gallery once the student and its embeddings are committed"""
+    transaction.on_commit(invalidate_reports)  # Reports show the student's name and group
+    if kwargs.get('created'):
+        invalidate_daily_counts(datetime.now().date())
+        transaction.on_commit(lambda: attendance_events.students_changed(1))
+    elif instance._summaries_moved:
+        dates = list(instance.attendance_set.values_list('date', flat=True))
+        transaction.on_commit(lambda: refresh_days(dates))
+    
+    service = get_loaded_face_service()
+    if service is None:
+        return  # The gallery is read from the database when the service is first loaded
+    
+    # add_student saves the embeddings after the student, inside the same transaction
+    transaction.on_commit(lambda: service.add_student_embeddings(instance))
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    """Drop a deleted student from the loaded gallery"""
+    # Today's attendance of the student is deleted with it, so the counts are rebuilt
+    invalidate_daily_counts(datetime.now().date())
+    transaction.on_commit(invalidate_reports)
+    transaction.on_commit(attendance_events.invalidate)
+    
+    service = get_loaded_face_service()
+    if service is None:
+        return
+    
+    student_id = instance.id  # Django clears the pk after the delete signals have run
+    transaction.on_commit(lambda: service.remove_student(student_id))
+
+
+def _attendance_changed(dates):
+    refresh_days(dates)
+    for date in dates:
+        invalidate_daily_counts(date)
+    invalidate_reports()
+    attendance_events.invalidate()
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def attendance_changed(sender, instance, origin=None, **kwargs):
+    """Refresh summaries, counts and reports once rows changed one by one are committed, e.g. in the admin
+
+    Rows deleted together, such as the attendance of a deleted student, are
+    gathered on the origin of the deletion and refreshed once. Bulk writes of
+    the recorder and absentee marking refresh their days themselves.
+    """
+    dates = getattr(origin, '_attendance_dates', None)
+    if dates is not None:
+        dates.add(instance.date)
+        return
+    dates = {instance.date}
+    if origin is not None:
+        origin._attendance_dates = dates
+    transaction.on_commit(lambda: _attendance_changed(dates))
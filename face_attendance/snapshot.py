@@ -0,0 +1,69 @@
+import json
+import os
+import numpy as np
+from django.db.models import Count, Max
+from .models import StudentEmbedding
+
+SNAPSHOT_FORMAT = 1
+ARRAYS = ('vectors', 'norms', 'student_ids')
+
+
+def gallery_version(model_name):
+    """Version stamp of the stored embeddings; changes on every insert or delete"""
+    stats = StudentEmbedding.objects.filter(model_name=model_name).aggregate(count=Count('id'), last_id=Max('id'))
+    return f"{stats['count']}:{stats['last_id'] or 0}"
+
+
+def write_snapshot(path, model_name):
+    """Write the gallery of a model to a directory of .npy files plus meta.json"""
+    os.makedirs(path, exist_ok=True)
+    version = gallery_version(model_name)
+    
+    vectors, norms, student_ids = StudentEmbedding.load_gallery(model_name)
+    arrays = {'vectors': vectors, 'norms': norms, 'student_ids': student_ids}
+    
+    # Write every file under a temporary name first so readers never see a half-written snapshot
+    for name, array in arrays.items():
+        tmp_path = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp_path, np.ascontiguousarray(array))
+        os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+    
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'model_name': model_name,
+        'dimension': vectors.shape[1],
+        'rows': len(student_ids),
+        'version': version,
+    }
+    tmp_path = os.path.join(path, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, 'meta.json'))
+    return meta
+
+
+def load_snapshot(path, model_name):
+    """Memory-map a snapshot, returning (vectors, norms, student_ids) or None if missing or stale"""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if meta.get('format') != SNAPSHOT_FORMAT or meta.get('model_name') != model_name:
+        return None
+    if meta.get('version') != gallery_version(model_name):
+        print(f"Gallery snapshot {path} is stale, loading from the database")
+        return None
+    
+    try:
+        # Read-only mappings let every worker share one page-cache copy of the gallery
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS]
+    except (OSError, ValueError) as e:
+        print(f"Error loading gallery snapshot {path}: {e}")
+        return None
+    
+    vectors, norms, student_ids = arrays
+    if len(vectors) != meta['rows'] or len(norms) != meta['rows'] or len(student_ids) != meta['rows']:
+        return None
+    return vectors, norms, student_ids
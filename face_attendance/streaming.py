@@ -0,0 +1,324 @@
+import asyncio
+import collections
+import threading
+import time
+import cv2
+from django.conf import settings
+from .camera import CameraReader
+from .pipeline import build_pipeline
+from .services import get_face_service
+
+CAMERA_UNAVAILABLE = (b'--frame\r\n'
+                      b'Content-Type: text/plain\r\n\r\n'
+                      b'Camera not available\r\n')
+
+
+def multipart_frame(jpeg):
+    """Wrap a JPEG image as one part of a multipart/x-mixed-replace stream"""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+
+class FrameProducer:
+    """Runs capture and recognition once per camera and publishes annotated JPEG frames
+
+    Any number of viewers subscribe to the latest frame; a slow viewer skips
+    frames instead of slowing down the producer or the other viewers.
+    """
+
+    def __init__(self, source, idle_timeout=None, previous=None):
+        self.source = source
+        self.previous = previous  # Producer of the same camera that is still shutting down
+        self.keep_alive = False  # Keep recognizing without viewers while an attendance session runs
+        # Seconds the producer keeps running after the last viewer leaves, so a page reload does not reopen the camera
+        self.idle_timeout = idle_timeout if idle_timeout is not None else getattr(settings, 'STREAM_IDLE_TIMEOUT', 5.0)
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.camera = None
+        self.running = False
+        self.failed = False  # Camera could not be opened
+        self.subscribers = 0
+        self.idle_since = time.monotonic()
+        self.sequence = 0
+        self.jpeg = None
+        self.started_at = None
+        self.latency_total = 0.0  # Capture to publish, summed over published frames
+        self.latency_max = 0.0
+        self.async_waiters = set()  # (event loop, asyncio.Event) of viewers awaiting the next frame
+
+    def start(self):
+        self.running = True
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"producer-{self.source}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Ask the producer to stop; viewers receive the end of the stream"""
+        self.stop_event.set()
+        with self.condition:
+            self._notify()
+
+    def try_subscribe(self):
+        """Register a viewer unless the producer is already shutting down"""
+        with self.condition:
+            if not self.running or self.stop_event.is_set():
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self.idle_since = time.monotonic()
+
+    def _notify(self):
+        """Wake every waiting viewer, threads and coroutines alike; call with the condition held"""
+        self.condition.notify_all()
+        for loop, event in self.async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def wait_for_frame(self, last_sequence, timeout=5.0):
+        """Block until a frame newer than last_sequence is published
+
+        Returns (sequence, jpeg), or (last_sequence, None) once the producer has stopped.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.sequence <= last_sequence and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            if self.sequence > last_sequence:
+                return self.sequence, self.jpeg
+            return last_sequence, None
+
+    async def wait_for_frame_async(self, last_sequence, timeout=5.0):
+        """Coroutine version of wait_for_frame that does not block a thread while waiting"""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self.condition:
+            if self.sequence > last_sequence:
+                return self.sequence, self.jpeg
+            if not self.running:
+                return last_sequence, None
+            self.async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.condition:
+                self.async_waiters.discard(waiter)
+        with self.condition:
+            if self.sequence > last_sequence:
+                return self.sequence, self.jpeg
+            return last_sequence, None
+
+    async def jpegs_async(self):
+        """Yield JPEG frames for a subscribed viewer from a coroutine until the producer stops; the caller unsubscribes"""
+        sequence = 0
+        while True:
+            sequence, jpeg = await self.wait_for_frame_async(sequence)
+            if jpeg is not None:
+                yield jpeg
+            elif not self.running:
+                break
+
+    async def frames_async(self):
+        """Async counterpart of frames() for ASGI; each viewer costs a coroutine instead of a thread"""
+        async for jpeg in self.jpegs_async():
+            yield multipart_frame(jpeg)
+        if self.failed:
+            yield CAMERA_UNAVAILABLE
+
+    def frames(self):
+        """Yield multipart JPEG parts for a subscribed viewer until the producer stops; the caller unsubscribes"""
+        sequence = 0
+        while True:
+            sequence, jpeg = self.wait_for_frame(sequence)
+            if jpeg is not None:
+                yield multipart_frame(jpeg)
+            elif not self.running:
+                break
+        if self.failed:
+            yield CAMERA_UNAVAILABLE
+
+    def stats(self):
+        """Throughput and capture-to-publish latency of this camera"""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        with self.condition:
+            stats = {
+                'source': str(self.source),
+                'running': self.running,
+                'failed': self.failed,
+                'viewers': self.subscribers,
+                'frames': self.sequence,
+                'fps': round(self.sequence / elapsed, 2) if elapsed else 0.0,
+                'mean_latency_ms': round(self.latency_total / self.sequence * 1000, 2) if self.sequence else 0.0,
+                'max_latency_ms': round(self.latency_max * 1000, 2),
+            }
+        if self.camera is not None:
+            stats['capture'] = self.camera.stats()
+        return stats
+
+    def _publish(self, processed_frame, captured_at):
+        """Encode an annotated frame and hand it to every viewer"""
+        ret, buffer = cv2.imencode('.jpg', processed_frame)
+        if not ret:
+            return
+
+        latency = time.monotonic() - captured_at
+        with self.condition:
+            self.jpeg = buffer.tobytes()
+            self.sequence += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self._notify()
+
+    def _run(self):
+        try:
+            if self.previous is not None and self.previous.thread is not None:
+                # Wait for the old producer to release the camera before opening it again
+                self.previous.thread.join(timeout=5.0)
+                self.previous = None
+            self.camera = CameraReader(self.source, buffer_size=getattr(settings, 'CAMERA_BUFFER_SIZE', 1)).start()
+            if not self.camera.is_opened():
+                self.failed = True
+                return
+
+            service = get_face_service()
+            pipeline = build_pipeline(service)
+            # With worker processes, several frames are in flight so capture and encoding overlap recognition
+            asynchronous = pipeline is service and service.worker_pool is not None
+            max_in_flight = service.worker_pool.processes if asynchronous else 0
+            timeout = service.worker_timeout
+            in_flight = collections.deque()
+
+            while not self.stop_event.is_set():
+                with self.condition:
+                    if self.subscribers == 0 and not self.keep_alive and time.monotonic() - self.idle_since > self.idle_timeout:
+                        # Stop accepting viewers in the same critical section as the idle check
+                        self.running = False
+                        break
+
+                success, frame = self.camera.read(timeout=1.0)
+                if not success:
+                    if not self.camera.is_opened():
+                        break
+                    continue
+
+                if not asynchronous:
+                    # Process frame with face recognition, once for all viewers
+                    self._publish(pipeline.process_frame(frame), self.camera.last_captured_at)
+                    continue
+
+                in_flight.append((self.camera.last_captured_at, service.process_frame_async(frame)))
+                while in_flight and (in_flight[0][1].done() or len(in_flight) >= max_in_flight):
+                    captured_at, future = in_flight.popleft()
+                    try:
+                        # Bounded, so a lost frame cannot keep the producer from seeing stop()
+                        self._publish(future.result(timeout=timeout), captured_at)
+                    except Exception as e:
+                        print(f"Error processing frame from camera {self.source}: {e}")
+        except Exception as e:
+            print(f"Error in frame producer for camera {self.source}: {e}")
+        finally:
+            if self.camera is not None:
+                self.camera.stop()
+            with self.condition:
+                self.running = False
+                self._notify()
+            _discard_producer(self)
+
+
+_producers = {}
+_producers_lock = threading.Lock()
+
+
+def _acquire(source, subscribe):
+    with _producers_lock:
+        producer = _producers.get(source)
+        if producer is not None:
+            if subscribe and producer.try_subscribe():
+                return producer
+            if not subscribe and producer.running and not producer.stop_event.is_set():
+                return producer
+        producer = FrameProducer(source, previous=producer)
+        producer.subscribers = 1 if subscribe else 0
+        producer.start()
+        _producers[source] = producer
+        return producer
+
+
+def subscribe(source=0):
+    """Return the producer for a camera source with one viewer registered, starting it if needed"""
+    return _acquire(source, subscribe=True)
+
+
+def start_producer(source, keep_alive=True):
+    """Start (or reuse) the producer of a camera source without registering a viewer"""
+    producer = _acquire(source, subscribe=False)
+    producer.keep_alive = keep_alive
+    return producer
+
+
+def producers():
+    """Producers currently registered in this process, keyed by source"""
+    with _producers_lock:
+        return dict(_producers)
+
+
+def stream(source=0, asynchronous=False):
+    """Multipart JPEG stream of a camera for one viewer, as an async iterator when asynchronous
+
+    The viewer is subscribed on the first iteration, so a response that is
+    closed before it sends anything leaves no subscription behind.
+    """
+    return _frames_async(source) if asynchronous else _frames(source)
+
+
+def _frames(source):
+    producer = subscribe(source)
+    try:
+        yield from producer.frames()
+    finally:
+        # Also runs when the viewer disconnects and the response closes the generator
+        producer.unsubscribe()
+
+
+async def _frames_async(source):
+    producer = subscribe(source)
+    try:
+        async for part in producer.frames_async():
+            yield part
+    finally:
+        # Also runs when the viewer disconnects and its task is cancelled
+        producer.unsubscribe()
+
+
+async def jpegs_async(source=0):
+    """JPEG frames of a camera for one viewer, subscribed on the first iteration like stream()"""
+    producer = subscribe(source)
+    try:
+        async for jpeg in producer.jpegs_async():
+            yield jpeg
+    finally:
+        producer.unsubscribe()
+
+
+def _discard_producer(producer):
+    with _producers_lock:
+        if _producers.get(producer.source) is producer:
+            del _producers[producer.source]
+
+
+def stop_producers():
+    """Stop every camera producer, e.g. when the attendance session ends"""
+    with _producers_lock:
+        producers = list(_producers.values())
+    for producer in producers:
+        producer.stop()
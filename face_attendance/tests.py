@@ -0,0 +1,127 @@
+from datetime import date, time, timedelta
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from face_attendance.events import attendance_events
+from face_attendance.metrics import StageTimings
+from face_attendance.models import Student, Attendance
+from face_attendance.pipeline import FaceTrack, TrackingPipeline
+from face_attendance.rollups import rebuild_summaries
+
+
+class AttendanceQueryCountTests(TestCase):
+    """The status, summary and report views issue a fixed number of queries, however many rows there are"""
+
+    @classmethod
+    def setUpTestData(cls):
+        students = Student.objects.bulk_create([
+            Student(name=f"Student{i}", surname="Test", father_name="Test", faculty=f"Faculty{i % 2}",
+                    direction="Test", group=f"G{i % 3}")
+            for i in range(30)
+        ])
+        today = date.today()
+        rows = []
+        for day in range(5):
+            for n, student in enumerate(students[:20]):
+                status = 'Late' if n % 4 == 0 else 'Present'
+                rows.append(Attendance(student=student, date=today - timedelta(days=day), status=status,
+                                       arrival_time=time(8, n), recognition_probability=80.0))
+        Attendance.objects.bulk_create(rows)
+        rebuild_summaries()
+
+    def setUp(self):
+        cache.clear()
+        attendance_events.invalidate()
+
+    def test_attendance_status(self):
+        # Day counts, student total and recent arrivals load the snapshot
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('attendance_status'))
+        status = response.json()
+        self.assertEqual((status['present'], status['late'], status['absent']), (15, 5, 10))
+
+        # Later requests are served from memory
+        with self.assertNumQueries(0):
+            self.client.get(reverse('attendance_status'))
+
+    def test_stop_attendance(self):
+        # Marking absentees inside a savepoint (4), the day's counts (2) and the summary rows (1)
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('stop_attendance'))
+        self.assertEqual(
+            (response.context['present_count'], response.context['late_count'], response.context['absent_count']),
+            (15, 5, 10)
+        )
+
+    def test_reports(self):
+        # The page, its counts from the daily summaries and the group and faculty choices
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('reports'))
+        self.assertEqual(len(response.context['records']), 50)
+        self.assertEqual(response.context['present_count'], 75)
+
+        # Cached until attendance changes; only the filter choices are queried again
+        with self.assertNumQueries(2):
+            self.client.get(reverse('reports'))
+
+    def test_reports_json(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('reports'), {'format': 'json', 'group': 'G0'})
+        self.assertEqual(len(response.json()['records']), 35)
+
+
+class FaceTrackVotingTests(SimpleTestCase):
+    """A track commits to an identity only on enough agreeing votes, or one very confident match"""
+
+    def vote(self, track, votes):
+        """Cast (student_id, similarity) votes, returning the index of the vote that confirmed the track"""
+        for i, (student_id, similarity) in enumerate(votes):
+            if track.identify(student_id, similarity):
+                return i
+        return None
+
+    def test_confirms_on_min_votes_that_lead(self):
+        track = FaceTrack(1, (0, 0, 10, 10), min_votes=3, confirm_similarity=0.9, vote_window=10)
+        self.assertEqual(self.vote(track, [(7, 0.6), (8, 0.6), (7, 0.6), (7, 0.7)]), 3)
+        self.assertEqual((track.student_id, track.similarity), (7, 0.7))
+
+    def test_confirms_when_rival_votes_leave_the_window(self):
+        # The lead comes from unknown votes dropping out of the window, on a vote for student 22
+        votes = [None, None, 7, None, 7, None, 7, 11, 12, 13, 21, 22]
+        track = FaceTrack(1, (0, 0, 10, 10), min_votes=3, confirm_similarity=0.9, vote_window=10)
+        confirmed_at = self.vote(track, [(vote, 0.6 if vote else 0.0) for vote in votes])
+        self.assertEqual(confirmed_at, len(votes) - 1)
+        self.assertEqual(track.student_id, 7)
+
+    def test_confirms_at_once_on_a_confident_match(self):
+        track = FaceTrack(1, (0, 0, 10, 10), min_votes=3, confirm_similarity=0.8, vote_window=10)
+        self.assertEqual(self.vote(track, [(None, 0.0), (5, 0.85)]), 1)
+        self.assertEqual((track.student_id, track.similarity), (5, 0.85))
+
+    def test_confirmed_track_ignores_later_votes(self):
+        track = FaceTrack(1, (0, 0, 10, 10), min_votes=3, confirm_similarity=0.8, vote_window=10)
+        self.vote(track, [(5, 0.85)])
+        self.assertFalse(track.identify(6, 0.99))
+        self.assertEqual(track.student_id, 5)
+
+    def test_recognize_records_the_confirmed_student(self):
+        class Service:
+            recognition_threshold = 0.4
+            timings = StageTimings()
+
+            def __init__(self):
+                self.recorded = []
+
+            def match_batch(self, embeddings, k=1):
+                # Embeddings stand in for the matched student id
+                return [[(student_id, 0.3)] if student_id else [] for student_id in embeddings]
+
+            def record_attendance(self, student_id, similarity):
+                self.recorded.append(student_id)
+
+        service = Service()
+        pipeline = TrackingPipeline(service)
+        track = FaceTrack(1, (0, 0, 10, 10), min_votes=3, confirm_similarity=0.9, vote_window=10)
+        for vote in [None, None, 7, None, 7, None, 7, 11, 12, 13, 21, 22]:
+            pipeline.recognize([track], [vote])
+        self.assertEqual(service.recorded, [7])
@@ -19,8 +19,11 @@ urlpatterns = [
     path('attendance/setup/', views.attendance_setup, name='attendance_setup'),
     path('attendance/start/', views.start_attendance, name='start_attendance'),
     path('attendance/video_feed/', views.video_feed, name='video_feed'),
+    path('attendance/video_feed/<str:camera_id>/', views.video_feed, name='video_feed_camera'),
     path('attendance/status/', views.attendance_status, name='attendance_status'),
+    path('attendance/events/', views.attendance_event_stream, name='attendance_events'),
     path('attendance/stop/', views.stop_attendance, name='stop_attendance'),
+    path('attendance/stats/', views.pipeline_stats, name='pipeline_stats'),
     
     # Reports
     path('reports/', views.reports, name='reports'),
@@ -1,32 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
 from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
 import json
-import cv2
 import numpy as np
-import pandas as pd
 import os
 import tempfile
 from datetime import datetime, timedelta
-from deepface import DeepFace
 from .models import Student, Schedule, Attendance, Contact, SMTPSettings
 from .forms import (
     StudentForm, ScheduleForm, ContactForm, SMTPSettingsForm, 
     AttendanceSetupForm, ReportFilterForm, EmailReportForm
 )
-from .services import FaceRecognitionService
-
-# Initialize face recognition service
-face_service = None
-
-def get_face_service():
-    global face_service
-    if face_service is None:
-        face_service = FaceRecognitionService()
-    return face_service
+from .services import get_face_service
+from .engine import engine
+from .inference import get_running_batcher
+from .recorder import get_attendance_recorder, get_running_recorder
+from .events import attendance_events, event_stream, event_stream_async
+from .queries import daily_counts, report_filters, report_queryset, report_page, report_counts
+from .absentees import mark_absent_students
+from .exports import report_rows, csv_chunks, write_xlsx, XLSX_CONTENT_TYPE
+from . import model_registry
 
 def index(request):
     """Home page view"""
@@ -60,20 +58,11 @@ def add_student(request):
                     # Process the image with DeepFace
                     try:
                         # Extract faces
-                        faces = DeepFace.extract_faces(
-                            img_path=temp_file_path,
-                            detector_backend="opencv",
-                            enforce_detection=False
-                        )
+                        faces = model_registry.extract_faces(temp_file_path)
                         
                         if faces:
                             # Get embedding for the first face
-                            embedding = DeepFace.represent(
-                                img_path=temp_file_path,
-                                model_name="VGG-Face",
-                                detector_backend="opencv",
-                                enforce_detection=False
-                            )
+                            embedding = model_registry.represent(temp_file_path)
                             
                             if embedding:
                                 face_embeddings.append(embedding)
@@ -93,11 +82,11 @@ def add_student(request):
                 return render(request, 'face_attendance/add_student.html', {'form': form})
             
             # Save student with face embeddings
-            student.set_face_embeddings(face_embeddings)
-            student.save()
+            with transaction.atomic():
+                student.save()
+                student.set_face_embeddings(face_embeddings, model_name=model_registry.MODEL_NAME)
             
-            # Reload face recognition service data
-            get_face_service().load_student_data()
+            # The face recognition gallery is patched by the Student signal handlers
             
             messages.success(request, f"Student {student.name} {student.surname} added successfully")
             return redirect('students_list')
@@ -109,9 +98,8 @@ def delete_student(request, student_id):
     """Delete a student"""
     student = get_object_or_404(Student, id=student_id)
     if request.method == 'POST':
+        # The face recognition gallery is patched by the Student signal handlers
         student.delete()
-        # Reload face recognition service data
-        get_face_service().load_student_data()
         messages.success(request, f"Student {student.name} {student.surname} deleted successfully")
         return redirect('students_list')
     
@@ -270,71 +258,51 @@ def start_attendance(request):
         'deadline': deadline.isoformat() if deadline else None,
     }
     
+    # Start recognition on every camera of the session
+    camera_ids = engine.start(setup_data, late_deadline=late_deadline)
+    
     return render(request, 'face_attendance/start_attendance.html', {
         'setup_data': setup_data,
         'late_deadline': late_deadline,
         'deadline': deadline,
+        'camera_ids': camera_ids,
     })
 
-def gen_frames():
-    """Generate video frames with face recognition"""
-    # Get face recognition service
-    service = get_face_service()
-    
-    # Open camera
-    camera = cv2.VideoCapture(0)
-    if not camera.isOpened():
-        yield (b'--frame\r\n'
-               b'Content-Type: text/plain\r\n\r\n'
-               b'Camera not available\r\n')
-        return
-    
-    while True:
-        success, frame = camera.read()
-        if not success:
-            break
-        else:
-            # Process frame with face recognition
-            processed_frame = service.process_frame(frame)
-            
-            # Encode the frame in JPEG format
-            ret, buffer = cv2.imencode('.jpg', processed_frame)
-            frame = buffer.tobytes()
-            
-            # Yield the frame in byte format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def video_feed(request, camera_id=None):
+    """Video feed for attendance tracking
+    
+    Capture and recognition run once per camera in a shared producer; every
+    viewer of the same camera receives the same annotated frames. Under ASGI
+    the frames are awaited by an async generator, so viewers do not hold threads.
+    """
+    setup_data = request.session.get('attendance_setup', {})
+    if camera_id is None:
+        camera_id = setup_data.get('camera', 0)
     
-    camera.release()
+    frames = engine.stream(camera_id, setup_data, asynchronous=isinstance(request, ASGIRequest))
+    if frames is None:
+        raise Http404(f"Unknown camera {camera_id}")
+    return StreamingHttpResponse(frames, content_type='multipart/x-mixed-replace; boundary=frame')
 
-def video_feed(request):
-    """Video feed for attendance tracking"""
-    return StreamingHttpResponse(gen_frames(), content_type='multipart/x-mixed-replace; boundary=frame')
+def pipeline_stats(request):
+    """Per-stage timing counters of the face recognition pipeline"""
+    stats = get_face_service().timings.summary()
+    stats['cameras'] = engine.stats()
+    batcher = get_running_batcher()
+    if batcher is not None:
+        stats['inference'] = batcher.stats()
+    recorder = get_running_recorder()
+    if recorder is not None:
+        stats['attendance'] = recorder.stats()
+    return JsonResponse(stats)
 
 def attendance_status(request):
-    """Get current attendance status"""
-    # Get today's attendance records
-    today = datetime.now().date()
-    attendance_records = Attendance.objects.filter(date=today).select_related('student')
+    """Get current attendance status
     
-    # Count statistics
-    present_count = attendance_records.filter(status='Present').count()
-    late_count = attendance_records.filter(status='Late').count()
-    
-    # Get all students
-    all_students = Student.objects.all()
-    total_count = all_students.count()
-    absent_count = total_count - present_count - late_count
-    
-    # Get recent records
-    recent_records = []
-    for record in attendance_records.order_by('-arrival_time')[:10]:
-        recent_records.append({
-            'name': f"{record.student.name} {record.student.surname}",
-            'time': record.arrival_time.strftime('%H:%M:%S'),
-            'status': record.status,
-            'probability': f"{record.recognition_probability:.2f}%"
-        })
+    Served from the in-memory snapshot that attendance events keep up to date.
+    """
+    status = attendance_events.snapshot()
+    del status['event_id']
     
     # Check if deadline has passed
     deadline_str = request.session.get('attendance_deadlines', {}).get('deadline')
@@ -345,132 +313,137 @@ def attendance_status(request):
         if datetime.now() > deadline:
             session_expired = True
     
-    return JsonResponse({
-        'present': present_count,
-        'late': late_count,
-        'absent': absent_count,
-        'total': total_count,
-        'recent_records': recent_records,
-        'session_expired': session_expired
-    })
+    status['session_expired'] = session_expired
+    return JsonResponse(status)
+
+def attendance_event_stream(request):
+    """Server-Sent Events with the attendance status and every new arrival
+    
+    A reconnecting browser sends Last-Event-ID and gets the events it missed.
+    """
+    last_id = request.headers.get('Last-Event-ID')
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    events = event_stream_async(last_id) if isinstance(request, ASGIRequest) else event_stream(last_id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Deliver events immediately behind nginx
+    return response
 
 def stop_attendance(request):
     """Stop attendance tracking and show summary"""
+    # Stop every camera of the session, which also ends the video streams
+    engine.stop()
+    # Write sightings still waiting in memory before counting
+    get_attendance_recorder().flush()
+    
     # Clear session data
     if 'attendance_setup' in request.session:
         del request.session['attendance_setup']
     if 'attendance_deadlines' in request.session:
         del request.session['attendance_deadlines']
     
-    # Get today's attendance records
-    today = datetime.now().date()
-    attendance_records = Attendance.objects.filter(date=today).select_related('student')
-    
     # Mark absent students
-    all_students = Student.objects.all()
-    present_student_ids = attendance_records.values_list('student_id', flat=True)
-    
-    for student in all_students:
-        if student.id not in present_student_ids:
-            Attendance.objects.create(
-                student=student,
-                date=today,
-                status='Absent'
-            )
+    today = datetime.now().date()
+    mark_absent_students(today)
     
-    # Refresh attendance records
+    # Get today's attendance records
     attendance_records = Attendance.objects.filter(date=today).select_related('student')
+    counts = daily_counts(today)
     
     return render(request, 'face_attendance/attendance_summary.html', {
         'attendance_records': attendance_records,
-        'present_count': attendance_records.filter(status='Present').count(),
-        'late_count': attendance_records.filter(status='Late').count(),
-        'absent_count': attendance_records.filter(status='Absent').count(),
-        'total_count': all_students.count()
+        'present_count': counts['present'],
+        'late_count': counts['late'],
+        'absent_count': counts['absent'],
+        'total_count': counts['total']
     })
 
 def reports(request):
-    """View attendance reports"""
-    form = ReportFilterForm(request.GET)
-    
-    # Get filter parameters
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    group = request.GET.get('group')
-    faculty = request.GET.get('faculty')
-    
-    # Build query
-    attendance_records = Attendance.objects.select_related('student').all()
+    """View attendance reports
+    
+    Rows are paginated newest first with ?after=<cursor> / ?before=<cursor>;
+    ?format=json returns the page as JSON for incremental loading.
+    """
+    filters = report_filters(request.GET)
+    try:
+        page_size = min(max(int(request.GET.get('page_size', settings.REPORT_PAGE_SIZE)), 1), 500)
+    except ValueError:
+        page_size = settings.REPORT_PAGE_SIZE
+    
+    # Pages and counts of the same filters are served from the report cache
+    page = report_page(filters, request.GET.get('after'), request.GET.get('before'), page_size)
+    counts = report_counts(filters)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'records': [
+                {
+                    'id': record['id'],
+                    'name': record['student']['name'],
+                    'surname': record['student']['surname'],
+                    'faculty': record['student']['faculty'],
+                    'group': record['student']['group'],
+                    'date': record['date'].isoformat(),
+                    'status': record['status'],
+                    'arrival_time': record['arrival_time'].strftime('%H:%M:%S') if record['arrival_time'] else None,
+                    'recognition_probability': record['recognition_probability'],
+                }
+                for record in page['records']
+            ],
+            'next_cursor': page['next_cursor'],
+            'previous_cursor': page['previous_cursor'],
+            'present': counts['present'],
+            'late': counts['late'],
+            'absent': counts['absent'],
+            'mean_probability': counts['mean_probability'],
+        })
     
-    if start_date:
-        attendance_records = attendance_records.filter(date__gte=start_date)
-    if end_date:
-        attendance_records = attendance_records.filter(date__lte=end_date)
-    if group:
-        attendance_records = attendance_records.filter(student__group=group)
-    if faculty:
-        attendance_records = attendance_records.filter(student__faculty=faculty)
+    form = ReportFilterForm(request.GET)
     
     # Get unique groups and faculties for filter dropdowns
     groups = Student.objects.values_list('group', flat=True).distinct()
     faculties = Student.objects.values_list('faculty', flat=True).distinct()
     
+    # Page links keep the filters and replace the cursor
+    def page_query(**cursor):
+        params = request.GET.copy()
+        for name in ('after', 'before', 'format'):
+            params.pop(name, None)
+        params.update(cursor)
+        return params.urlencode()
+    
     return render(request, 'face_attendance/reports.html', {
         'form': form,
-        'records': attendance_records,
+        'records': page['records'],
         'groups': groups,
         'faculties': faculties,
-        'present_count': attendance_records.filter(status='Present').count(),
-        'late_count': attendance_records.filter(status='Late').count(),
-        'absent_count': attendance_records.filter(status='Absent').count(),
+        'present_count': counts['present'],
+        'late_count': counts['late'],
+        'absent_count': counts['absent'],
+        'next_query': page_query(after=page['next_cursor']) if page['next_cursor'] else None,
+        'previous_query': page_query(before=page['previous_cursor']) if page['previous_cursor'] else None,
     })
 
 def export_report(request):
     """Export attendance report to Excel"""
-    # Get filter parameters
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    group = request.GET.get('group')
-    faculty = request.GET.get('faculty')
-    
-    # Build query
-    attendance_records = Attendance.objects.select_related('student').all()
-    
-    if start_date:
-        attendance_records = attendance_records.filter(date__gte=start_date)
-    if end_date:
-        attendance_records = attendance_records.filter(date__lte=end_date)
-    if group:
-        attendance_records = attendance_records.filter(student__group=group)
-    if faculty:
-        attendance_records = attendance_records.filter(student__faculty=faculty)
-    
-    # Create DataFrame
-    data = []
-    for record in attendance_records:
-        data.append({
-            'Name': record.student.name,
-            'Surname': record.student.surname,
-            'Father Name': record.student.father_name,
-            'Faculty': record.student.faculty,
-            'Direction': record.student.direction,
-            'Group': record.student.group,
-            'Date': record.date,
-            'Status': record.status,
-            'Arrival Time': record.arrival_time,
-            'Recognition Probability': f"{record.recognition_probability:.2f}%" if record.recognition_probability > 0 else None
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Create Excel file
-    response = HttpResponse(content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = f'attachment; filename=attendance_report_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.xlsx'
-    
-    # Write DataFrame to Excel
-    df.to_excel(response, index=False)
-    
-    return response
+    attendance_records = report_queryset(report_filters(request.GET))
+    
+    # Rows are read in chunks as plain values, never as one list in memory
+    rows = report_rows(attendance_records)
+    filename = f'attendance_report_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}'
+    
+    if request.GET.get('format') == 'csv':
+        # CSV is sent while the rows are still being read
+        response = StreamingHttpResponse(csv_chunks(rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename={filename}.csv'
+        return response
+    
+    # An .xlsx file is a zip whose directory comes last, so it is written to disk in
+    # constant memory first and then streamed from there
+    excel_file = tempfile.TemporaryFile()
+    write_xlsx(rows, excel_file)
+    excel_file.seek(0)
+    return FileResponse(excel_file, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_CONTENT_TYPE)
 
 def email_report(request):
     """Email attendance report"""
@@ -481,46 +454,12 @@ def email_report(request):
             subject = form.cleaned_data['subject']
             message = form.cleaned_data['message']
             
-            # Get filter parameters
-            start_date = request.GET.get('start_date')
-            end_date = request.GET.get('end_date')
-            group = request.GET.get('group')
-            faculty = request.GET.get('faculty')
-            
-            # Build query
-            attendance_records = Attendance.objects.select_related('student').all()
-            
-            if start_date:
-                attendance_records = attendance_records.filter(date__gte=start_date)
-            if end_date:
-                attendance_records = attendance_records.filter(date__lte=end_date)
-            if group:
-                attendance_records = attendance_records.filter(student__group=group)
-            if faculty:
-                attendance_records = attendance_records.filter(student__faculty=faculty)
-            
-            # Create DataFrame
-            data = []
-            for record in attendance_records:
-                data.append({
-                    'Name': record.student.name,
-                    'Surname': record.student.surname,
-                    'Father Name': record.student.father_name,
-                    'Faculty': record.student.faculty,
-                    'Direction': record.student.direction,
-                    'Group': record.student.group,
-                    'Date': record.date,
-                    'Status': record.status,
-                    'Arrival Time': record.arrival_time,
-                    'Recognition Probability': f"{record.recognition_probability:.2f}%" if record.recognition_probability > 0 else None
-                })
-            
-            df = pd.DataFrame(data)
+            attendance_records = report_queryset(report_filters(request.GET))
             
             # Create Excel file
             filename = f'attendance_report_{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.xlsx'
             filepath = os.path.join(tempfile.gettempdir(), filename)
-            df.to_excel(filepath, index=False)
+            write_xlsx(report_rows(attendance_records), filepath)
             
             # Send email
             email = EmailMessage(
@@ -532,7 +471,7 @@ def email_report(request):
             
             # Attach Excel file
             with open(filepath, 'rb') as f:
-                email.attach(filename, f.read(), 'application/vnd.ms-excel')
+                email.attach(filename, f.read(), XLSX_CONTENT_TYPE)
             
             try:
                 email.send()
@@ -0,0 +1,234 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+from django.conf import settings
+
+
+def _worker_main(connection):
+    """Worker process: detect and embed faces of frames handed over in shared memory"""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attendance_system.settings')
+    django.setup()
+    from . import model_registry
+    from .pipeline import iou_matrix
+    from .services import parse_face
+
+    model_registry.warmup()
+    attached = {}
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break  # The pool went away
+        if task is None:
+            break
+        task_id, name, shape, dtype, skip_boxes, skip_iou = task
+        try:
+            shm = attached.get(name)
+            if shm is None:
+                # Spawned workers share the parent's resource tracker, which unlinks the block once
+                shm = shared_memory.SharedMemory(name=name)
+                attached[name] = shm
+            frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+            boxes = []
+            aligned_crops = []
+            other_embeddings = []
+            skipped = []
+            for face in model_registry.extract_faces(frame):
+                parsed = parse_face(face)
+                if parsed is None:
+                    continue
+                face_img, box = parsed
+                if skip_boxes and iou_matrix([box], skip_boxes).max() >= skip_iou:
+                    skipped.append(box)
+                elif isinstance(face, dict):
+                    # extract_faces returns RGB in [0, 1]; the model expects the BGR channel order
+                    boxes.append(box)
+                    aligned_crops.append(face_img[:, :, ::-1])
+                else:
+                    other_embeddings.append((box, model_registry.represent(face_img)))
+
+            embeddings = list(model_registry.represent_batch(aligned_crops)) if aligned_crops else []
+            for box, embedding in other_embeddings:
+                boxes.append(box)
+                embeddings.append(embedding)
+            boxes.extend(skipped)
+            embeddings.extend([None] * len(skipped))
+            connection.send((task_id, boxes, embeddings, None))
+        except Exception as e:
+            connection.send((task_id, [], [], str(e)))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class RecognitionWorkerPool:
+    """Runs face detection and embedding in worker processes, outside the GIL and the web worker
+
+    Frames are copied into a ring of shared memory slots and only the slot
+    name travels through each worker's pipe; results are (boxes, embeddings).
+    A worker that dies is replaced and the frames it held fail.
+    """
+
+    def __init__(self, processes=2, slots=None):
+        self.processes = processes
+        self.slot_count = slots or processes * 2
+        self.context = multiprocessing.get_context('spawn')  # Do not fork the web process with its threads and models
+        # One pipe per worker rather than a shared queue, which a worker killed while holding its lock would block for good
+        self.workers = [None] * processes
+        self.connections = [None] * processes
+        self.assigned = [set() for _ in range(processes)]  # Task ids in flight per worker
+        self.slots = []
+        self.free_slots = queue.Queue()
+        self.pending = {}  # task id -> (future, slot, worker index)
+        self.lock = threading.Lock()
+        self.task_ids = itertools.count(1)
+        self.collector = threading.Thread(target=self._collect, name='face-worker-results', daemon=True)
+        self.running = False
+
+    def _spawn(self, index):
+        connection, worker_connection = self.context.Pipe()
+        worker = self.context.Process(target=_worker_main, args=(worker_connection,), name=f"face-worker-{index}", daemon=True)
+        worker.start()
+        worker_connection.close()
+        self.workers[index] = worker
+        self.connections[index] = connection
+        self.assigned[index] = set()
+
+    def start(self):
+        for index in range(self.processes):
+            self._spawn(index)
+        for _ in range(self.slot_count):
+            self.free_slots.put(None)  # Slots are allocated on first use, sized to the frames
+        self.running = True
+        self.collector.start()
+        return self
+
+    def submit(self, frame, skip_boxes=(), skip_iou=0.3):
+        """Queue a BGR frame; the Future resolves to (boxes, embeddings)
+
+        Faces overlapping one of skip_boxes by at least skip_iou are detected
+        but not embedded; their embedding is None.
+        """
+        frame = np.ascontiguousarray(frame)
+        try:
+            slot = self.free_slots.get(timeout=30)  # Blocks while every slot is in flight
+        except queue.Empty:
+            raise RuntimeError("No free frame slot; are the recognition workers running?")
+        if slot is None or slot.size < frame.nbytes:
+            if slot is not None:
+                self._release(slot)
+            slot = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            with self.lock:
+                self.slots.append(slot)
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+
+        future = Future()
+        task_id = next(self.task_ids)
+        skip_boxes = [tuple(int(v) for v in box) for box in skip_boxes]
+        with self.lock:
+            # The least busy worker takes the frame
+            index = min(range(self.processes), key=lambda i: len(self.assigned[i]))
+            self.pending[task_id] = (future, slot, index)
+            self.assigned[index].add(task_id)
+            try:
+                self.connections[index].send((task_id, slot.name, frame.shape, frame.dtype.str, skip_boxes, skip_iou))
+            except OSError:
+                pass  # The worker died; the collector fails the frame when it replaces it
+        return future
+
+    def _collect(self):
+        while self.running:
+            with self.lock:
+                connections, workers = list(self.connections), list(self.workers)
+            for ready in wait(connections + [worker.sentinel for worker in workers], timeout=1.0):
+                if ready not in connections:
+                    continue  # A worker exited; handled below
+                try:
+                    task_id, boxes, embeddings, error = ready.recv()
+                except (EOFError, OSError):
+                    continue
+                with self.lock:
+                    future, slot, index = self.pending.pop(task_id, (None, None, None))
+                    if index is not None:
+                        self.assigned[index].discard(task_id)
+                if slot is not None:
+                    self.free_slots.put(slot)
+                if future is None:
+                    continue
+                if error:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result((boxes, embeddings))
+
+            for index, worker in enumerate(workers):
+                if worker.exitcode is not None and self.running:
+                    self._replace(index)
+
+    def _replace(self, index):
+        """Restart a worker that exited, e.g. killed for running out of memory, failing the frames it held"""
+        worker = self.workers[index]
+        print(f"Recognition worker {worker.name} exited with code {worker.exitcode}; restarting it")
+        with self.lock:
+            lost = [self.pending.pop(task_id) for task_id in self.assigned[index] if task_id in self.pending]
+            connection = self.connections[index]
+            self._spawn(index)
+        connection.close()
+        for future, slot, _ in lost:
+            self.free_slots.put(slot)
+            future.set_exception(RuntimeError(f"Recognition worker {worker.name} died"))
+
+    def _release(self, slot):
+        with self.lock:
+            if slot in self.slots:
+                self.slots.remove(slot)
+        slot.close()
+        slot.unlink()
+
+    def stop(self):
+        self.running = False
+        if self.collector.is_alive():
+            self.collector.join(timeout=5.0)
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.join(timeout=5.0)
+            if worker.is_alive():
+                worker.terminate()
+        for connection in self.connections:
+            connection.close()
+        with self.lock:
+            slots, self.slots = self.slots, []
+            pending, self.pending = self.pending, {}
+        for future, _, _ in pending.values():
+            future.set_exception(RuntimeError("Recognition workers stopped"))
+        for slot in slots:
+            slot.close()
+            slot.unlink()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Return the process-wide worker pool, or None when FACE_WORKER_PROCESSES is 0"""
+    global _pool
+    processes = getattr(settings, 'FACE_WORKER_PROCESSES', 0)
+    if not processes:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = RecognitionWorkerPool(processes).start()
+    return _pool